@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     name = 'core'
     verbose_name = 'Базовый функционал'
+
+    def ready(self):
+        from . import sqlite  # noqa: F401
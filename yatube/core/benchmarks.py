@@ -0,0 +1,48 @@
+"""Общие помощники для команд-бенчмарков."""
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.test.utils import setup_databases, teardown_databases
+
+
+@contextmanager
+def isolated_database(verbosity=0):
+    """Создаёт тестовую базу на время замера и удаляет её после.
+
+    Рабочая база при этом не затрагивается, как и при прогоне тестов.
+    """
+    old_config = setup_databases(verbosity=verbosity, interactive=False)
+    cache.clear()
+    try:
+        yield
+    finally:
+        cache.clear()
+        teardown_databases(old_config, verbosity=verbosity)
+
+
+def percentile(samples, percent):
+    """Перцентиль методом ближайшего ранга."""
+    ordered = sorted(samples)
+    rank = round(percent / 100 * len(ordered)) - 1
+    rank = max(0, min(len(ordered) - 1, rank))
+    return ordered[rank]
+
+
+def measure(func, repeat):
+    """Вызывает func repeat раз и возвращает времена в миллисекундах."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def summarize(samples):
+    return {
+        'p50': round(statistics.median(samples), 3),
+        'p95': round(percentile(samples, 95), 3),
+        'p99': round(percentile(samples, 99), 3),
+    }
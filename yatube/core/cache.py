@@ -0,0 +1,37 @@
+"""Бэкенд кэша со счётчиками попаданий для /metrics."""
+import re
+
+from django.core.cache.backends.locmem import LocMemCache
+
+from . import metrics
+
+_MISSING = object()
+FRAGMENT_PREFIX = 'template.cache.'
+
+
+def key_family(key):
+    """Семейство ключа: имя фрагмента {% cache %} или префикс до ':'."""
+    if key.startswith(FRAGMENT_PREFIX):
+        # Имя фрагмента в ключе остаётся в кавычках из шаблона.
+        return key[len(FRAGMENT_PREFIX):].split('.', 1)[0].strip('\'"')
+    return re.split(r'[:|]', key, 1)[0]
+
+
+def record(key, result, amount=1):
+    metrics.inc(
+        'yatube_cache_requests_total',
+        {'cache': key_family(key), 'result': result},
+        amount,
+    )
+
+
+class InstrumentedLocMemCache(LocMemCache):
+    # get_many базового класса читает ключи через get(), поэтому каждый
+    # ключ учитывается ровно один раз.
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version)
+        if value is _MISSING:
+            record(key, 'miss')
+            return default
+        record(key, 'hit')
+        return value
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.cache import cache
+
+
+def feed_count_key(feed, pk=None):
+    """Ключ счётчика ленты: общей, группы, автора или подписок."""
+    return f'feed_count:{feed}:{pk}'
+
+
+def cached_count(key, queryset):
+    """Возвращает число записей ленты из кэша.
+
+    При холодном кэше значение считается один раз и живёт не дольше
+    FEED_COUNT_TIMEOUT: это верхняя граница расхождения с базой, если
+    какое-то изменение прошло мимо сигналов (bulk_create, update).
+    """
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.add(key, count, settings.FEED_COUNT_TIMEOUT)
+    return count
+
+
+def adjust_count(key, delta):
+    """Сдвигает счётчик, если он уже есть в кэше."""
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # Счётчика нет в кэше — он будет посчитан при следующем чтении.
+        pass
+
+
+def reset_count(*keys):
+    cache.delete_many(keys)
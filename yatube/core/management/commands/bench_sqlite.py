@@ -0,0 +1,138 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from core.sqlite import apply_pragmas
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+SCHEMA = '''
+CREATE TABLE post (
+    id INTEGER PRIMARY KEY,
+    text TEXT NOT NULL,
+    pub_date TEXT NOT NULL
+);
+CREATE INDEX post_date_idx ON post (pub_date DESC, id DESC);
+CREATE TABLE comment (
+    id INTEGER PRIMARY KEY,
+    post_id INTEGER NOT NULL REFERENCES post (id),
+    text TEXT NOT NULL,
+    created TEXT NOT NULL
+);
+CREATE INDEX comment_post_idx ON comment (post_id, created DESC, id DESC);
+'''
+FEED = '''
+SELECT post.id, post.text, COUNT(comment.id)
+FROM post LEFT JOIN comment ON comment.post_id = post.id
+WHERE post.id IN (SELECT id FROM post ORDER BY pub_date DESC, id DESC LIMIT 10)
+GROUP BY post.id
+'''
+COMMENT = '''
+INSERT INTO comment (post_id, text, created)
+VALUES (?, ?, strftime('%Y-%m-%d %H:%M:%f', 'now'))
+'''
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность SQLite при одновременных '
+        'чтениях ленты и записи комментариев: настройки по умолчанию '
+        'против прагм из SQLITE_PRAGMAS. Замер идёт на временном файле.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--posts', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        modes = (
+            # Так соединение открывает Django без прагм: журнал отката
+            # и пятисекундное ожидание блокировки из модуля sqlite3.
+            ('default', {}),
+            ('tuned', settings.SQLITE_PRAGMAS),
+        )
+        for name, pragmas in modes:
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'bench.sqlite3')
+                self.populate(path, options['posts'])
+                result = self.bench(path, pragmas, options)
+            self.stdout.write(
+                f'{name:>8}: чтений {result["reads"]:8.0f}/с, '
+                f'записей {result["writes"]:8.0f}/с, '
+                f'ошибок блокировки {result["locked"]}'
+            )
+
+    def connect(self, path, pragmas):
+        connection = sqlite3.connect(
+            path, isolation_level=None, check_same_thread=False
+        )
+        apply_pragmas(connection, pragmas)
+        return connection
+
+    def populate(self, path, posts):
+        connection = self.connect(path, {})
+        connection.executescript(SCHEMA)
+        connection.execute('BEGIN')
+        connection.executemany(
+            'INSERT INTO post (text, pub_date) VALUES (?, ?)',
+            (
+                (f'Пост {number}', f'2022-01-01 00:00:{number:06d}')
+                for number in range(posts)
+            ),
+        )
+        connection.execute('COMMIT')
+        connection.close()
+
+    def bench(self, path, pragmas, options):
+        stop = threading.Event()
+        counters = {'reads': 0, 'writes': 0, 'locked': 0}
+        lock = threading.Lock()
+
+        def worker(key, action):
+            connection = self.connect(path, pragmas)
+            done = locked = 0
+            number = 0
+            while not stop.is_set():
+                number += 1
+                try:
+                    action(connection, number)
+                    done += 1
+                except sqlite3.OperationalError:
+                    locked += 1
+            connection.close()
+            with lock:
+                counters[key] += done
+                counters['locked'] += locked
+
+        def read(connection, number):
+            connection.execute(FEED).fetchall()
+
+        def write(connection, number):
+            connection.execute(
+                COMMENT, (number % options['posts'] + 1, 'Комментарий')
+            )
+
+        threads = [
+            threading.Thread(target=worker, args=('reads', read))
+            for _ in range(options['readers'])
+        ] + [
+            threading.Thread(target=worker, args=('writes', write))
+            for _ in range(options['writers'])
+        ]
+        for thread in threads:
+            thread.start()
+        started = time.perf_counter()
+        time.sleep(options['seconds'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        return {
+            'reads': counters['reads'] / elapsed,
+            'writes': counters['writes'] / elapsed,
+            'locked': counters['locked'],
+        }
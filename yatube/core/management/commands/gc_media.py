@@ -0,0 +1,224 @@
+import os
+import time
+from itertools import chain, islice
+
+from core.bloom import BloomFilter
+from core.models import StoredFile
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import FileField
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.helpers import deserialize
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix, del_prefix
+from sorl.thumbnail.models import KVStore
+
+
+def file_fields():
+    for model in apps.get_models():
+        for field in model._meta.get_fields():
+            if isinstance(field, FileField):
+                yield model, field
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def scan(root, directory):
+    """Файлы под root/directory: (имя от root, размер, время изменения).
+
+    Обход без рекурсии и без списка всех файлов: os.scandir отдаёт
+    stat вместе с записью каталога.
+    """
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        try:
+            entries = os.scandir(os.path.join(root, current))
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                name = f'{current}/{entry.name}'
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(name)
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    yield name, stat.st_size, stat.st_mtime
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет из каталогов загрузок (upload_to полей-файлов) и '
+        'миниатюр (THUMBNAIL_PREFIX) файлы, на которые не ссылается ни '
+        'одна строка, и записи sorl-thumbnail удалённых картинок. Живые '
+        'имена собираются из базы в фильтр Блума, поэтому на файл не '
+        'приходится ни одного запроса; перед удалением порция кандидатов '
+        'сверяется с базой. Файлы моложе --min-age не трогаются: их '
+        'загрузка может быть ещё не зафиксирована.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать, ничего не удаляя',
+        )
+        parser.add_argument(
+            '--min-age', type=int, default=60 * 60, help='Секунды'
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--error-rate',
+            type=float,
+            default=0.001,
+            help='Доля сирот, которых фильтр Блума примет за живые',
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        self.dry_run = options['dry_run']
+        self.batch_size = options['batch_size']
+        live = BloomFilter(self.capacity(), options['error_rate'])
+        self.add_live_files(live)
+        dead_keys = self.add_live_thumbnails(live)
+        removed, reclaimed = self.remove_orphans(
+            live, time.time() - options['min_age']
+        )
+        if not self.dry_run:
+            for keys in batches(dead_keys, self.batch_size):
+                default.kvstore._delete_raw(*keys)
+        action = 'Можно удалить' if self.dry_run else 'Удалено'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{action} файлов: {removed}, {reclaimed} байт; записей '
+                f'sorl-thumbnail: {len(dead_keys)}; '
+                f'{time.perf_counter() - started:.1f} с'
+            )
+        )
+
+    def live_names(self, model, field):
+        return (
+            model._default_manager.filter(**{f'{field.name}__gt': ''})
+            .order_by()
+            .values_list(field.name, flat=True)
+        )
+
+    def capacity(self):
+        files = sum(
+            self.live_names(model, field).count()
+            for model, field in file_fields()
+        )
+        thumbnails = KVStore.objects.filter(
+            key__startswith=add_prefix('', 'image')
+        ).count()
+        # Имя и ключ sorl на каждый файл и имя каждой миниатюры.
+        return 2 * files + thumbnails
+
+    def add_live_files(self, live):
+        for model, field in file_fields():
+            names = self.live_names(model, field)
+            for name in names.iterator(chunk_size=self.batch_size):
+                live.add(name)
+                live.add(f'kv:{ImageFile(name, field.storage).key}')
+
+    def add_live_thumbnails(self, live):
+        """Отмечает миниатюры живых картинок; возвращает ключи мёртвых."""
+        dead_keys = []
+        rows = KVStore.objects.filter(
+            key__startswith=add_prefix('', 'thumbnails')
+        ).values_list('key', 'value')
+        for batch in batches(rows.iterator(), self.batch_size):
+            thumbnail_keys = []
+            for key, value in batch:
+                source_key = del_prefix(key)
+                keys = [add_prefix(name) for name in deserialize(value)]
+                if f'kv:{source_key}' in live:
+                    thumbnail_keys.extend(keys)
+                else:
+                    dead_keys += [key, add_prefix(source_key), *keys]
+            for keys in batches(thumbnail_keys, self.batch_size):
+                images = KVStore.objects.filter(key__in=keys).values_list(
+                    'value', flat=True
+                )
+                for image in images:
+                    live.add(deserialize(image)['name'])
+        return dead_keys
+
+    def roots(self):
+        roots = {thumbnail_settings.THUMBNAIL_PREFIX.strip('/')}
+        for model, field in file_fields():
+            # Поля без своего каталога (варианты картинок лежат среди
+            # миниатюр) и с вычисляемым upload_to не задают корня.
+            upload_to = field.upload_to
+            if isinstance(upload_to, str) and upload_to.strip('/'):
+                roots.add(upload_to.strip('/').split('/')[0])
+        return sorted(roots)
+
+    def remove_orphans(self, live, cutoff):
+        files = chain.from_iterable(
+            scan(settings.MEDIA_ROOT, root) for root in self.roots()
+        )
+        removed = reclaimed = 0
+        for batch in batches(files, self.batch_size):
+            orphans = [
+                (name, size)
+                for name, size, modified in batch
+                if modified < cutoff and name not in live
+            ]
+            if orphans:
+                referenced = self.referenced([name for name, _ in orphans])
+                orphans = [
+                    (name, size)
+                    for name, size in orphans
+                    if name not in referenced
+                ]
+            if not self.dry_run:
+                orphans = [
+                    (name, size)
+                    for name, size in orphans
+                    if self.remove(name)
+                ]
+                StoredFile.objects.filter(
+                    name__in=[name for name, _ in orphans],
+                    references__lte=0,
+                ).delete()
+            removed += len(orphans)
+            reclaimed += sum(size for _, size in orphans)
+        return removed, reclaimed
+
+    def referenced(self, names):
+        """Имена из names, на которые ссылаются сейчас.
+
+        Фильтр Блума построен в начале обхода. С тех пор пост мог снова
+        загрузить те же байты, и хранилище взяло готовый файл, не
+        записывая его заново. Поэтому перед удалением порция
+        сверяется с базой.
+        """
+        referenced = set(
+            StoredFile.objects.filter(
+                name__in=names, references__gt=0
+            ).values_list('name', flat=True)
+        )
+        for model, field in file_fields():
+            referenced.update(
+                model._default_manager.filter(
+                    **{f'{field.name}__in': names}
+                ).values_list(field.name, flat=True)
+            )
+        return referenced
+
+    def remove(self, name):
+        try:
+            os.remove(os.path.join(settings.MEDIA_ROOT, name))
+        except FileNotFoundError:
+            return False
+        return True
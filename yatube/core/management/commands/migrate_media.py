@@ -0,0 +1,76 @@
+import time
+
+from core.storage import recount_references, referencing_fields
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит файлы, загруженные до ContentAddressedStorage, под '
+        'имена по содержимому. Строки читаются порциями по первичному '
+        'ключу; старый файл удаляется после фиксации порции. Миниатюры '
+        'новых имён строятся заново (см. warm_thumbnails).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        self.moved = self.deduplicated = self.missing = 0
+        self.reclaimed = 0
+        for model, field in referencing_fields():
+            self.migrate_field(model, field, options['batch_size'])
+        recount_references()
+        # В закэшированных лентах остались адреса старых файлов.
+        cache.clear()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Перенесено файлов: {self.moved}, из них совпали с уже '
+                f'сохранёнными: {self.deduplicated}, не найдено: '
+                f'{self.missing}, освобождено {self.reclaimed} байт за '
+                f'{time.perf_counter() - started:.2f} с'
+            )
+        )
+
+    def migrate_field(self, model, field, batch_size):
+        storage = field.storage
+        rows = model.objects.filter(**{f'{field.name}__gt': ''}).order_by(
+            'pk'
+        )
+        last_pk = None
+        while True:
+            batch = rows if last_pk is None else rows.filter(pk__gt=last_pk)
+            batch = list(batch.values_list('pk', field.name)[:batch_size])
+            if not batch:
+                return
+            last_pk = batch[-1][0]
+            names = {
+                name
+                for _, name in batch
+                if not storage.is_hashed_name(name)
+            }
+            with transaction.atomic():
+                for name in sorted(names):
+                    self.migrate_file(model, field, name)
+
+    def migrate_file(self, model, field, name):
+        storage = field.storage
+        if not storage.exists(name):
+            self.missing += 1
+            return
+        size = storage.size(name)
+        with storage.open(name) as content:
+            new_name, written = storage.store(name, content)
+        if not written:
+            self.deduplicated += 1
+            self.reclaimed += size
+        # Все строки со старым именем, а не только строки порции:
+        # иначе следующие порции не нашли бы удалённый файл.
+        model.objects.filter(**{field.name: name}).update(
+            **{field.name: new_name}
+        )
+        transaction.on_commit(lambda: storage.remove_unreferenced(name))
+        self.moved += 1
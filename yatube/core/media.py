@@ -0,0 +1,149 @@
+"""Раздача медиафайлов.
+
+В рабочем режиме view только проверяет путь и заголовки условного
+запроса по stat() файла, а байты отдаёт фронтовой прокси по
+X-Accel-Redirect (nginx) или X-Sendfile (Apache, lighttpd) — процессы
+Python файлы не читают. Режим 'python' отдаёт файл сам и нужен для
+разработки и тестов. Имена по SHA-256 содержимого (оригиналы из
+ContentAddressedStorage) никогда не меняют байты, поэтому кэшируются
+браузером навсегда. Имена миниатюр sorl (и вариантов для srcset) —
+хеш имени исходника и параметров, а не байтов: после перегенерации
+по тому же адресу лежит новый файл, и кэшируются они как обычные.
+"""
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote
+
+from core.storage import HASHED_NAME
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    StreamingHttpResponse,
+)
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+BYTE_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+CHUNK_SIZE = 64 * 2 ** 10
+
+
+def media_path(name):
+    try:
+        path = safe_join(settings.MEDIA_ROOT, name)
+    except SuspiciousFileOperation:
+        raise Http404('Файл не найден')
+    try:
+        file_stat = os.stat(path)
+    except OSError:
+        raise Http404('Файл не найден')
+    if not stat.S_ISREG(file_stat.st_mode):
+        raise Http404('Файл не найден')
+    return path, file_stat
+
+
+def media_etag(name, file_stat):
+    hashed = HASHED_NAME.search(name)
+    if hashed:
+        return f'"{hashed.group("digest")}"'
+    return f'"{file_stat.st_mtime_ns:x}-{file_stat.st_size:x}"'
+
+
+def cache_control(name):
+    if HASHED_NAME.search(name):
+        return f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    return f'public, max-age={settings.MEDIA_MAX_AGE}'
+
+
+def byte_range(header, size):
+    """(начало, конец) из заголовка Range или None.
+
+    Поддерживается один диапазон; на несколько отвечаем файлом целиком,
+    как разрешает RFC 7233. Для недостижимого диапазона — ValueError.
+    """
+    match = BYTE_RANGE.match(header or '')
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    first, last = match.groups()
+    if first == '':
+        # bytes=-500: последние 500 байт.
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        raise ValueError(header)
+    return start, end
+
+
+def read_range(path, start, end):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = file.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                return
+            remaining -= len(chunk)
+            yield chunk
+
+
+def python_response(request, path, file_stat, etag):
+    size = file_stat.st_size
+    header = request.META.get('HTTP_RANGE')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and if_range != etag:
+        # Файл у клиента устарел: докачка невозможна, отдаём целиком.
+        header = None
+    try:
+        requested = byte_range(header, size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    if requested is None:
+        return FileResponse(open(path, 'rb'))
+    start, end = requested
+    response = StreamingHttpResponse(read_range(path, start, end), status=206)
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = end - start + 1
+    return response
+
+
+@require_safe
+def serve(request, path):
+    """Отдаёт файл из MEDIA_ROOT способом из MEDIA_SERVE_MODE."""
+    full_path, file_stat = media_path(path)
+    etag = media_etag(path, file_stat)
+    last_modified = int(file_stat.st_mtime)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        mode = settings.MEDIA_SERVE_MODE
+        if mode == 'x-accel-redirect':
+            response = HttpResponse()
+            response['X-Accel-Redirect'] = (
+                settings.MEDIA_ACCEL_PREFIX + quote(path)
+            )
+        elif mode == 'x-sendfile':
+            response = HttpResponse()
+            response['X-Sendfile'] = full_path
+        else:
+            response = python_response(request, full_path, file_stat, etag)
+        content_type, encoding = mimetypes.guess_type(path)
+        response['Content-Type'] = content_type or 'application/octet-stream'
+        if encoding:
+            response['Content-Encoding'] = encoding
+        response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = cache_control(path)
+    return response
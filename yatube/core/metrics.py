@@ -0,0 +1,229 @@
+"""Метрики в текстовом формате Prometheus.
+
+Значения копятся в памяти процесса под блокировкой. Если задан
+METRICS_DIR, каждый процесс не чаще раза в METRICS_FLUSH_INTERVAL
+секунд сбрасывает туда свой снимок (файл на pid), а /metrics
+складывает снимки всех процессов: так видны все воркеры, а не только
+тот, что ответил на запрос. Снимки завершившихся процессов удаляются
+при сборе, иначе их значения складывались бы после каждого перезапуска.
+Каталог поэтому должен быть свой у каждой машины.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+COUNTER = 'counter'
+HISTOGRAM = 'histogram'
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+DEFINITIONS = {
+    'yatube_requests_total': (
+        COUNTER, 'Обработанные запросы по view, методу и статусу', None
+    ),
+    'yatube_request_duration_seconds': (
+        HISTOGRAM, 'Время ответа view', LATENCY_BUCKETS
+    ),
+    'yatube_db_queries': (
+        HISTOGRAM, 'Число SQL-запросов на один HTTP-запрос', QUERY_BUCKETS
+    ),
+    'yatube_db_duration_seconds': (
+        HISTOGRAM, 'Суммарное время SQL на один HTTP-запрос', LATENCY_BUCKETS
+    ),
+    'yatube_cache_requests_total': (
+        COUNTER, 'Обращения к кэшу по семейству ключей и результату', None
+    ),
+    'yatube_thumbnail_duration_seconds': (
+        HISTOGRAM, 'Время генерации миниатюры', LATENCY_BUCKETS
+    ),
+}
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_last_flush = 0.0
+
+
+def inc(name, labels, amount=1):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name, labels, value):
+    buckets = DEFINITIONS[name][2]
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        if key not in _histograms:
+            # Счётчики корзин без накопления, последняя — +Inf.
+            _histograms[key] = [[0] * (len(buckets) + 1), 0.0, 0]
+        histogram = _histograms[key]
+        histogram[0][bisect_left(buckets, value)] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+
+def snapshot_unlocked():
+    return {
+        'counters': [
+            [name, labels, value]
+            for (name, labels), value in _counters.items()
+        ],
+        'histograms': [
+            [name, labels, list(counts), total, count]
+            for (name, labels), (counts, total, count) in _histograms.items()
+        ],
+    }
+
+
+def snapshot():
+    with _lock:
+        return snapshot_unlocked()
+
+
+def take():
+    """Снимок процесса с обнулением.
+
+    Так рабочий процесс пула передаёт свои метрики родителю вместе с
+    результатом задачи, а родитель добавляет их к своим через absorb().
+    """
+    with _lock:
+        data = snapshot_unlocked()
+        _counters.clear()
+        _histograms.clear()
+    return data
+
+
+def absorb(data):
+    """Прибавляет к метрикам процесса снимок, полученный от take()."""
+    with _lock:
+        add_snapshot(_counters, _histograms, data)
+
+
+def flush(force=False):
+    """Сохраняет снимок процесса в METRICS_DIR, если пора."""
+    global _last_flush
+    directory = settings.METRICS_DIR
+    now = time.monotonic()
+    if not directory or (
+        not force and now - _last_flush < settings.METRICS_FLUSH_INTERVAL
+    ):
+        return
+    _last_flush = now
+    os.makedirs(directory, exist_ok=True)
+    # Запись во временный файл и os.replace: читатель никогда не видит
+    # наполовину записанный снимок.
+    descriptor, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(descriptor, 'w') as file:
+        json.dump(snapshot(), file)
+    os.replace(temporary, os.path.join(directory, f'{os.getpid()}.json'))
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Процесс есть, но принадлежит другому пользователю.
+        return True
+    return True
+
+
+def collect():
+    """Снимки всех живых процессов (или только текущего)."""
+    directory = settings.METRICS_DIR
+    if not directory:
+        return [snapshot()]
+    flush(force=True)
+    snapshots = []
+    for entry in os.scandir(directory):
+        pid, extension = os.path.splitext(entry.name)
+        if extension != '.json' or not pid.isdigit():
+            continue
+        if not process_alive(int(pid)):
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+            continue
+        try:
+            with open(entry.path) as file:
+                snapshots.append(json.load(file))
+        except (OSError, ValueError):
+            # Файл удалили или заменили между scandir и open.
+            continue
+    return snapshots
+
+
+def add_snapshot(counters, histograms, data):
+    for name, labels, value in data['counters']:
+        key = (name, tuple(map(tuple, labels)))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, counts, total, count in data['histograms']:
+        key = (name, tuple(map(tuple, labels)))
+        merged = histograms.setdefault(key, [[0] * len(counts), 0.0, 0])
+        merged[0] = [a + b for a, b in zip(merged[0], counts)]
+        merged[1] += total
+        merged[2] += count
+
+
+def merge(snapshots):
+    counters, histograms = {}, {}
+    for data in snapshots:
+        add_snapshot(counters, histograms, data)
+    return counters, histograms
+
+
+def format_labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', r'\\').replace('"', r'\"'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def render():
+    counters, histograms = merge(collect())
+    lines = []
+    for name, (kind, help_text, buckets) in DEFINITIONS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == COUNTER:
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{format_labels(labels)} {value}')
+            continue
+        for (metric, labels), (counts, total, count) in sorted(
+            histograms.items()
+        ):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, bucket in zip(buckets + ('+Inf',), counts):
+                cumulative += bucket
+                lines.append(
+                    f'{name}_bucket{format_labels(labels, le=bound)} '
+                    f'{cumulative}'
+                )
+            lines.append(f'{name}_sum{format_labels(labels)} {total}')
+            lines.append(f'{name}_count{format_labels(labels)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    """Очищает метрики процесса (для тестов)."""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
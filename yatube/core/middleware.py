@@ -0,0 +1,134 @@
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+from .query_budget import QueryRecorder
+from .routers import PIN_COOKIE
+
+logger = logging.getLogger('yatube.query_budget')
+
+
+class ReadYourWritesMiddleware:
+    """После изменяющего запроса закрепляет клиента за основной базой.
+
+    Кука хранит момент окончания окна: пока он не наступил, @read_only
+    не отправляет чтения этого клиента на реплики, и он сразу видит
+    свой пост или комментарий, даже если реплика отстаёт.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE'):
+            window = settings.READ_YOUR_WRITES_WINDOW
+            response.set_cookie(
+                PIN_COOKIE,
+                f'{time.time() + window:.3f}',
+                max_age=window,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+
+class QueryBudgetMiddleware:
+    """Следит за числом и временем SQL-запросов на каждый view.
+
+    Учитывается доля запросов QUERY_BUDGET_SAMPLE_RATE, остальные
+    проходят без обёрток. Превышение бюджета или повтор одного шаблона
+    SQL не меньше QUERY_BUDGET_MAX_REPEATS раз пишется в лог
+    предупреждением с именем view, остальные замеры — на уровне DEBUG.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.QUERY_BUDGET_SAMPLE_RATE:
+            return self.get_response(request)
+        recorder = QueryRecorder()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        request.query_stats = recorder
+        self.check_budget(request, recorder)
+        return response
+
+    def check_budget(self, request, recorder):
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else request.path
+        repeated = recorder.repeated(settings.QUERY_BUDGET_MAX_REPEATS)
+        over_budget = (
+            recorder.count > settings.QUERY_BUDGET_MAX_QUERIES
+            or recorder.duration_ms > settings.QUERY_BUDGET_MAX_SQL_MS
+        )
+        level = logging.WARNING if over_budget or repeated else logging.DEBUG
+        if not logger.isEnabledFor(level):
+            return
+        message = '%s: %d запросов, %.1f мс SQL'
+        args = [view_name, recorder.count, recorder.duration_ms]
+        for shape, times in repeated:
+            message += '\n  N+1, %d раз: %s'
+            args += [times, shape]
+        logger.log(level, message, *args)
+
+
+class QueryCounter:
+    """Минимальная обёртка: только число и время запросов."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+class MetricsMiddleware:
+    """Собирает метрики запросов для /metrics (core.metrics)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+        match = getattr(request, 'resolver_match', None)
+        # Имя view, а не путь: иначе у метрик будет по ряду на каждый
+        # пост и профиль.
+        view = match.view_name if match else 'unresolved'
+        metrics.inc(
+            'yatube_requests_total',
+            {
+                'view': view,
+                'method': request.method,
+                'status': response.status_code,
+            },
+        )
+        metrics.observe(
+            'yatube_request_duration_seconds', {'view': view}, elapsed
+        )
+        metrics.observe('yatube_db_queries', {'view': view}, counter.count)
+        metrics.observe(
+            'yatube_db_duration_seconds', {'view': view}, counter.duration
+        )
+        metrics.flush()
+        return response
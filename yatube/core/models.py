@@ -0,0 +1,20 @@
+from django.db import models
+
+
+class StoredFile(models.Model):
+    """Файл в ContentAddressedStorage и число ссылок на него.
+
+    Одинаковые загрузки хранятся одним файлом, и удалить его можно,
+    только когда исчезла последняя ссылка.
+    """
+
+    name = models.CharField('Имя в хранилище', max_length=255, unique=True)
+    size = models.BigIntegerField('Размер, байт')
+    references = models.PositiveIntegerField('Число ссылок', default=0)
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        verbose_name = 'Файл хранилища'
+        verbose_name_plural = 'Файлы хранилища'
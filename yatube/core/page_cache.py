@@ -0,0 +1,61 @@
+"""Кэш лент с версионными ключами.
+
+Ключ закэшированного тела ленты включает версии пространств имён, от
+которых оно зависит ('index', 'group:<slug>', ...). Сигналы увеличивают
+версию при изменении данных, и старые копии просто перестают читаться,
+поэтому ленты можно хранить часами без риска показать устаревшее —
+если кэш общий для всех воркеров (см. PAGE_CACHE_TIMEOUT в настройках).
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def page_version_key(namespace):
+    return f'page_version:{namespace}'
+
+
+def page_versions(*namespaces):
+    keys = [page_version_key(namespace) for namespace in namespaces]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Начальная версия из времени не совпадёт ни с одной прежней,
+            # даже если ключ версии был вытеснен из кэша.
+            version = int(time.time() * 1000)
+            if not cache.add(key, version, settings.PAGE_VERSION_TIMEOUT):
+                # Версию успел создать параллельный запрос.
+                version = cache.get(key)
+            versions[key] = version
+    return [versions[key] for key in keys]
+
+
+def bump_page_versions(*namespaces):
+    for namespace in namespaces:
+        try:
+            cache.incr(page_version_key(namespace))
+        except ValueError:
+            # Версии нет — значит, нет и закэшированных с ней страниц.
+            pass
+
+
+def feed_cache_context(request, *namespaces):
+    """Контекст для {% cache %} тела ленты.
+
+    Тело ленты не зависит от пользователя, поэтому одна копия
+    обслуживает всех, а шапка, переключатель и кнопка подписки
+    рисуются на каждый запрос вокруг неё. Пространства имён входят в
+    ключ вместе с версиями: версии разных групп и профилей растут с
+    близких значений и могут совпасть.
+    """
+    versions = page_versions(*namespaces)
+    scope = ','.join(
+        f'{namespace}={version}'
+        for namespace, version in zip(namespaces, versions)
+    )
+    position = (request.GET.get('page'), request.GET.get('cursor'))
+    return {
+        'feed_cache_timeout': settings.PAGE_CACHE_TIMEOUT,
+        'feed_cache_key': f'{scope}:{position}',
+    }
@@ -0,0 +1,155 @@
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes, force_str
+from django.utils.functional import cached_property
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from .counters import cached_count
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def encode_cursor(direction, value, pk):
+    """Упаковывает позицию в ленте в непрозрачную строку для URL."""
+    raw = f'{direction}|{value.isoformat()}|{pk}'
+    return urlsafe_base64_encode(force_bytes(raw))
+
+
+def decode_cursor(cursor):
+    """Разбирает курсор, при любой ошибке поднимает ValueError."""
+    if not cursor:
+        raise ValueError('Пустой курсор')
+    raw = force_str(urlsafe_base64_decode(cursor))
+    direction, value, pk = raw.split('|')
+    value = parse_datetime(value)
+    if direction not in (NEXT, PREVIOUS) or value is None:
+        raise ValueError(f'Некорректный курсор: {cursor}')
+    return direction, value, int(pk)
+
+
+class CachedCountPaginator(Paginator):
+    """Пагинатор, который берёт число записей из кэша счётчиков."""
+
+    def __init__(self, object_list, per_page, count_key, count_list=None):
+        super().__init__(object_list, per_page)
+        self.count_key = count_key
+        self.count_list = count_list
+
+    @cached_property
+    def count(self):
+        # count_list — более дешёвый запрос с тем же числом строк,
+        # если исходный нагружен JOIN или аннотациями.
+        if self.count_list is None:
+            return cached_count(self.count_key, self.object_list)
+        return cached_count(self.count_key, self.count_list)
+
+
+class CursorPage(Page):
+    """Страница keyset-пагинации.
+
+    Записи выбираются лениво при первом обращении, поэтому страница,
+    которую не отрисовали, не стоит ни одного запроса.
+    """
+
+    def __init__(self, cursor, paginator):
+        self.cursor = cursor
+        self.number = None
+        self.paginator = paginator
+
+    def __repr__(self):
+        return f'<Page cursor={self.cursor!r}>'
+
+    @cached_property
+    def _window(self):
+        return self.paginator.fetch(self.cursor)
+
+    @property
+    def object_list(self):
+        return self._window[0]
+
+    @property
+    def previous_cursor(self):
+        return self._window[1]
+
+    @property
+    def next_cursor(self):
+        return self._window[2]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator(Paginator):
+    """Пагинация по ключу (field, tiebreak) без COUNT(*) и OFFSET.
+
+    Стоимость любой страницы одинакова: это диапазонный просмотр
+    индекса от позиции, зашитой в курсор. Второй столбец ключа должен
+    быть уникальным и входить в тот же индекс, что и field, иначе
+    база досортирует окно сама.
+    """
+
+    is_cursor = True
+
+    def __init__(self, object_list, per_page, field='pub_date', tiebreak='pk'):
+        super().__init__(object_list, per_page)
+        self.field = field
+        self.tiebreak = tiebreak
+
+    def get_page(self, cursor):
+        return CursorPage(cursor, self)
+
+    def fetch(self, cursor):
+        """Возвращает (записи, курсор назад, курсор вперёд)."""
+        try:
+            direction, value, pk = decode_cursor(cursor)
+        except (TypeError, ValueError):
+            direction, value, pk = None, None, None
+        rows = self.window(direction, value, pk, self.per_page + 1)
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if not rows:
+            return rows, None, None
+        if direction == PREVIOUS:
+            rows = rows[::-1]
+            return (
+                rows,
+                self._cursor(PREVIOUS, rows[0]) if has_more else None,
+                self._cursor(NEXT, rows[-1]),
+            )
+        return (
+            rows,
+            self._cursor(PREVIOUS, rows[0]) if direction else None,
+            self._cursor(NEXT, rows[-1]) if has_more else None,
+        )
+
+    def window(self, direction, value, pk, limit):
+        """Выбирает до limit записей за позицией курсора.
+
+        Для направления назад записи идут по возрастанию ключа,
+        иначе — по убыванию.
+        """
+        field, tiebreak = self.field, self.tiebreak
+        if direction == PREVIOUS:
+            return list(
+                self.object_list.filter(
+                    Q(**{f'{field}__gt': value})
+                    | Q(**{field: value, f'{tiebreak}__gt': pk})
+                ).order_by(field, tiebreak)[:limit]
+            )
+        queryset = self.object_list
+        if direction == NEXT:
+            queryset = queryset.filter(
+                Q(**{f'{field}__lt': value})
+                | Q(**{field: value, f'{tiebreak}__lt': pk})
+            )
+        return list(queryset.order_by(f'-{field}', f'-{tiebreak}')[:limit])
+
+    def _cursor(self, direction, obj):
+        return encode_cursor(
+            direction, getattr(obj, self.field), getattr(obj, self.tiebreak)
+        )
@@ -0,0 +1,50 @@
+"""Учёт SQL-запросов одного HTTP-запроса.
+
+QueryRecorder подключается к соединениям через execute_wrapper и
+считает запросы, их суммарное время и повторы одного и того же SQL.
+Параметры в SQL не подставлены, поэтому одинаковый «шаблон» запроса,
+выполненный много раз подряд, и есть признак N+1.
+"""
+import re
+import time
+from collections import Counter
+
+# Списки параметров разной длины — один и тот же шаблон: IN (%s, %s).
+PLACEHOLDERS = re.compile(r'\((?:\s*%s\s*,)*\s*%s\s*\)')
+NUMBERS = re.compile(r'\b\d+\b')
+
+
+def fingerprint(sql):
+    sql = PLACEHOLDERS.sub('(...)', sql)
+    return NUMBERS.sub('?', ' '.join(sql.split()))
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.statements[sql] += 1
+
+    @property
+    def duration_ms(self):
+        return self.duration * 1000
+
+    def repeated(self, threshold):
+        """Шаблоны SQL, выполненные не меньше threshold раз."""
+        shapes = Counter()
+        for sql, times in self.statements.items():
+            shapes[fingerprint(sql)] += times
+        return [
+            (shape, times)
+            for shape, times in shapes.most_common()
+            if times >= threshold
+        ]
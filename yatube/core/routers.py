@@ -0,0 +1,76 @@
+"""Маршрутизация чтений на реплики.
+
+Чтения уходят на реплику только внутри view, помеченного @read_only:
+в остальном коде (формы, сигналы, админка) чтение и запись идут на
+основную базу, и свежезаписанные данные всегда видны. После своего
+изменяющего запроса пользователь ещё READ_YOUR_WRITES_WINDOW секунд
+читает с основной базы, пока реплики догоняют её.
+"""
+import random
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+
+PIN_COOKIE = 'primary_until'
+
+_state = threading.local()
+
+
+def replica_reads_allowed():
+    return getattr(_state, 'read_only', False)
+
+
+def pinned_to_primary(request):
+    """Попадает ли запрос в окно read-your-writes после своей записи."""
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def read_only(view):
+    """Разрешает view читать с реплик.
+
+    Помечаются только GET и HEAD: изменяющие запросы и запросы в окне
+    read-your-writes работают с основной базой.
+    """
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or pinned_to_primary(
+            request
+        ):
+            return view(request, *args, **kwargs)
+        previous = replica_reads_allowed()
+        _state.read_only = True
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _state.read_only = previous
+
+    return wrapper
+
+
+class ReplicaRouter:
+    """Пишет в 'default', читает с DATABASE_REPLICAS внутри @read_only."""
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # Связанные объекты читаем оттуда же, откуда сам объект.
+            return instance._state.db
+        if settings.DATABASE_REPLICAS and replica_reads_allowed():
+            return random.choice(settings.DATABASE_REPLICAS)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная база.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return True
@@ -0,0 +1,29 @@
+"""Настройка соединений SQLite для боевой нагрузки.
+
+По умолчанию SQLite пишет через журнал отката: пока идёт запись,
+читатели ждут, а конкурирующие записи быстро получают «database is
+locked». Прагмы из settings.SQLITE_PRAGMAS применяются к каждому новому
+соединению: WAL разводит читателей и писателя, busy_timeout заставляет
+ждать блокировку вместо ошибки, остальные уменьшают число обращений к
+диску.
+"""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+def pragma_statements(pragmas):
+    return [f'PRAGMA {name} = {value}' for name, value in pragmas.items()]
+
+
+def apply_pragmas(cursor, pragmas):
+    for statement in pragma_statements(pragmas):
+        cursor.execute(statement)
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        apply_pragmas(cursor, settings.SQLITE_PRAGMAS)
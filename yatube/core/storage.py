@@ -0,0 +1,226 @@
+"""Хранилище медиа, адресуемое содержимым.
+
+Имя файла — SHA-256 его байтов, разложенный по вложенным каталогам
+из первых символов хеша: posts/3f/a1/3fa1….jpg. Так ни в одном каталоге
+не копятся миллионы файлов, а повторная загрузка той же картинки не
+занимает места. Ссылки на файл считаются в core.StoredFile: save()
+добавляет ссылку, delete() снимает её, а файл удаляется вместе с
+последней.
+"""
+import hashlib
+import operator
+import os
+import posixpath
+import re
+import tempfile
+from functools import reduce
+
+from django.apps import apps
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, FileField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.deconstruct import deconstructible
+
+# Путь из хеша содержимого: posts/ab/cd/<sha256>.jpg.
+HASHED_NAME = re.compile(
+    r'(^|/)[0-9a-f]{2}/[0-9a-f]{2}/(?P<digest>[0-9a-f]{64})(\.\w+)?$'
+)
+BATCH_SIZE = 500
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def content_name(self, name, content):
+        """Имя по содержимому в том же каталоге, что и name."""
+        digest = content_hash(content)
+        directory, filename = posixpath.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return posixpath.join(
+            directory, digest[:2], digest[2:4], digest + extension
+        )
+
+    def is_hashed_name(self, name):
+        return bool(HASHED_NAME.search(name))
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        return self.store(name, content)[0]
+
+    def store(self, name, content):
+        """Сохраняет файл и добавляет ссылку; возвращает (имя, записан ли).
+
+        Если те же байты уже хранятся, файл не пишется повторно.
+        """
+        name = self.content_name(name, content)
+        written = not self.exists(name) and self.write(name, content)
+        if not written:
+            # Время изменения — время последней загрузки: gc_media не
+            # трогает свежие файлы, пока ссылка может быть не видна.
+            try:
+                os.utime(self.path(name))
+            except FileNotFoundError:
+                written = self.write(name, content)
+        self.acquire(name, content.size)
+        return name, written
+
+    def get_available_name(self, name, max_length=None):
+        # Занятое имя по содержимому занято теми же байтами: суффикс
+        # FileSystemStorage дал бы копию с именем не по хешу.
+        return name
+
+    def _save(self, name, content):
+        self.write(name, content)
+        return name
+
+    def write(self, name, content):
+        """Пишет файл, если его ещё нет; возвращает, записан ли он.
+
+        Байты пишутся во временный файл рядом, а под своим именем он
+        появляется через os.link. Ссылка не заменяет существующий файл:
+        если те же байты одновременно загрузил другой запрос, link
+        завершается FileExistsError, и готовый файл просто остаётся.
+        """
+        path = self.path(name)
+        directory = os.path.dirname(path)
+        if self.directory_permissions_mode is not None:
+            old_umask = os.umask(0)
+            try:
+                os.makedirs(
+                    directory, self.directory_permissions_mode, exist_ok=True
+                )
+            finally:
+                os.umask(old_umask)
+        else:
+            os.makedirs(directory, exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(
+            dir=directory, prefix='.upload-'
+        )
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                for chunk in content.chunks():
+                    file.write(chunk)
+            # mkstemp создаёт файл только для владельца, а его должен
+            # читать и фронтовой прокси.
+            os.chmod(temporary, self.file_permissions_mode or 0o644)
+            try:
+                os.link(temporary, path)
+            except FileExistsError:
+                return False
+            return True
+        finally:
+            os.remove(temporary)
+
+    def acquire(self, name, size):
+        from .models import StoredFile
+
+        files = StoredFile.objects.filter(name=name)
+        if files.update(references=F('references') + 1):
+            return
+        try:
+            with transaction.atomic():
+                StoredFile.objects.create(name=name, size=size, references=1)
+        except IntegrityError:
+            files.update(references=F('references') + 1)
+
+    def delete(self, name):
+        """Снимает ссылку; файл удаляется после фиксации транзакции.
+
+        Файлы, о которых хранилище не знает (загруженные до его
+        появления), не трогаются: их переносит migrate_media.
+        """
+        from .models import StoredFile
+
+        files = StoredFile.objects.filter(name=name)
+        files.update(references=F('references') - 1)
+        if files.filter(references=0).delete()[0]:
+            transaction.on_commit(lambda: self.remove_unreferenced(name))
+
+    def remove_unreferenced(self, name):
+        from .models import StoredFile
+
+        # Пока ждали фиксации, тот же файл мог быть загружен снова.
+        if not StoredFile.objects.filter(name=name).exists():
+            super().delete(name)
+
+
+def referencing_fields():
+    """Поля моделей, хранящие файлы в ContentAddressedStorage."""
+    for model in apps.get_models():
+        for field in model._meta.get_fields():
+            if isinstance(field, FileField) and isinstance(
+                field.storage, ContentAddressedStorage
+            ):
+                yield model, field
+
+
+def references_to(model_field):
+    """Подзапрос с числом строк модели, ссылающихся на файл."""
+    model, field = model_field
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field.name: OuterRef('name')})
+            .order_by()
+            .values(field.name)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        0,
+    )
+
+
+def recount_references(names=None):
+    """Пересчитывает ссылки по данным таблиц.
+
+    Нужен после записей в обход save(): bulk_create, update(). Если
+    переданы names, пересчитываются только эти файлы.
+    """
+    fields = list(referencing_fields())
+    if not fields:
+        return
+    if names is None:
+        recount_names(fields)
+        return
+    names = list(names)
+    for start in range(0, len(names), BATCH_SIZE):
+        recount_names(fields, names[start:start + BATCH_SIZE])
+
+
+def recount_names(fields, names=None):
+    from .models import StoredFile
+
+    known = StoredFile.objects.values('name')
+    files = StoredFile.objects.all()
+    if names is not None:
+        files = files.filter(name__in=names)
+    for model, field in fields:
+        referenced = model.objects.filter(**{f'{field.name}__gt': ''})
+        if names is not None:
+            referenced = referenced.filter(**{f'{field.name}__in': names})
+        referenced = (
+            referenced.exclude(**{f'{field.name}__in': known})
+            .order_by()
+            .values_list(field.name, flat=True)
+            .distinct()
+        )
+        StoredFile.objects.bulk_create(
+            (
+                StoredFile(name=name, size=field.storage.size(name))
+                for name in referenced.iterator()
+                if field.storage.is_hashed_name(name)
+                and field.storage.exists(name)
+            ),
+            ignore_conflicts=True,
+        )
+    files.update(references=reduce(operator.add, map(references_to, fields)))
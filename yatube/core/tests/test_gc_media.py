@@ -0,0 +1,141 @@
+import io
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from PIL import Image
+from posts.models import Post
+from posts.thumbnails import generate_thumbnails
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore
+
+from ..bloom import BloomFilter
+from ..management.commands.gc_media import Command
+from ..models import StoredFile
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+User = get_user_model()
+
+
+class BloomFilterTest(TestCase):
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(1000, error_rate=0.01)
+        names = [f'posts/{number}.jpg' for number in range(1000)]
+        for name in names:
+            bloom.add(name)
+        self.assertTrue(all(name in bloom for name in names))
+        false_positives = sum(
+            f'cache/{number}.jpg' in bloom for number in range(10000)
+        )
+        self.assertLess(false_positives, 300)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class GcMediaTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='auth')
+
+    def tearDown(self):
+        # Обход видит весь MEDIA_ROOT, поэтому файлы других тестов
+        # не должны в нём оставаться.
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, name, color):
+        buffer = io.BytesIO()
+        Image.new('RGB', (600, 300), color).save(buffer, 'PNG')
+        post = Post.objects.create(
+            author=self.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(name, buffer.getvalue(), 'image/png'),
+        )
+        self.assertIsNone(generate_thumbnails(post.image.name))
+        return post
+
+    def media_files(self):
+        return {
+            os.path.relpath(os.path.join(directory, name), TEMP_MEDIA_ROOT)
+            for directory, _, names in os.walk(TEMP_MEDIA_ROOT)
+            for name in names
+        }
+
+    def gc(self, **options):
+        output = io.StringIO()
+        call_command('gc_media', stdout=output, **options)
+        return output.getvalue()
+
+    def test_removes_orphans_and_keeps_live_files(self):
+        live = self.create_post('live.png', 'teal')
+        live_files = self.media_files()
+        dead = self.create_post('dead.png', 'orange')
+        dead_name = dead.image.name
+        # Файл удаляется в on_commit, которого TestCase не выполняет,
+        # так что картинка и её миниатюры остаются сиротами.
+        dead.delete()
+        stray = os.path.join(TEMP_MEDIA_ROOT, 'posts', 'stray.jpg')
+        with open(stray, 'wb') as file:
+            file.write(b'x' * 100)
+        orphans = self.media_files() - live_files
+        self.assertIn(dead_name, orphans)
+        self.assertTrue(any(name.startswith('cache/') for name in orphans))
+
+        self.assertIn('Можно удалить файлов: 0', self.gc(dry_run=True))
+        report = self.gc(dry_run=True, min_age=0)
+        self.assertIn(f'Можно удалить файлов: {len(orphans)}', report)
+        self.assertEqual(self.media_files(), live_files | orphans)
+
+        reclaimed = sum(
+            os.path.getsize(os.path.join(TEMP_MEDIA_ROOT, name))
+            for name in orphans
+        )
+        report = self.gc(min_age=0)
+        self.assertIn(f'{len(orphans)}, {reclaimed} байт', report)
+        self.assertEqual(self.media_files(), live_files)
+        thumbnail_rows = KVStore.objects.filter(
+            key__startswith=add_prefix('', 'thumbnails')
+        )
+        self.assertEqual(thumbnail_rows.count(), 1)
+        self.assertTrue(live.image_variants.exists())
+
+    def test_reupload_during_collection_is_kept(self):
+        dead = self.create_post('dead.png', 'orange')
+        name = dead.image.name
+        dead.delete()
+        add_live_thumbnails = Command.add_live_thumbnails
+        reuploads = []
+
+        def reupload_after_filter(command, live):
+            dead_keys = add_live_thumbnails(command, live)
+            reuploads.append(self.create_post('again.png', 'orange'))
+            return dead_keys
+
+        with mock.patch.object(
+            Command, 'add_live_thumbnails', reupload_after_filter
+        ):
+            self.gc(min_age=0)
+        self.assertEqual(reuploads[0].image.name, name)
+        self.assertTrue(os.path.exists(os.path.join(TEMP_MEDIA_ROOT, name)))
+        self.assertEqual(StoredFile.objects.get(name=name).references, 1)
+
+    def test_deduplicated_upload_refreshes_age(self):
+        dead = self.create_post('dead.png', 'orange')
+        path = os.path.join(TEMP_MEDIA_ROOT, dead.image.name)
+        dead.delete()
+        day_ago = time.time() - 24 * 60 * 60
+        os.utime(path, (day_ago, day_ago))
+        self.create_post('again.png', 'orange')
+        self.assertGreater(os.path.getmtime(path), day_ago)
+        self.assertIn('Удалено файлов: 0', self.gc())
@@ -0,0 +1,127 @@
+import os
+import shutil
+import tempfile
+from http import HTTPStatus
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+HASHED_NAME = 'posts/ab/cd/' + 'abcd' * 16 + '.jpg'
+THUMBNAIL_NAME = 'cache/ab/cd/' + 'abcd' * 8 + '.jpg'
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, MEDIA_SERVE_MODE='python')
+class MediaServeTest(TestCase):
+    content = bytes(range(256)) * 4
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for name in ('posts/plain.jpg', HASHED_NAME, THUMBNAIL_NAME):
+            path = os.path.join(TEMP_MEDIA_ROOT, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(cls.content)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def get(self, name, **headers):
+        return self.client.get(settings.MEDIA_URL + name, **headers)
+
+    def test_full_file(self):
+        response = self.get('posts/plain.jpg')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(
+            response['Cache-Control'],
+            f'public, max-age={settings.MEDIA_MAX_AGE}',
+        )
+
+    def test_hashed_names_are_immutable(self):
+        response = self.get(HASHED_NAME)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['ETag'], '"' + 'abcd' * 16 + '"')
+
+    def test_thumbnails_are_not_immutable(self):
+        # Имя миниатюры sorl не зависит от её байтов.
+        response = self.get(THUMBNAIL_NAME)
+        self.assertEqual(
+            response['Cache-Control'],
+            f'public, max-age={settings.MEDIA_MAX_AGE}',
+        )
+        self.assertNotEqual(response['ETag'], '"' + 'abcd' * 8 + '"')
+
+    def test_byte_ranges(self):
+        cases = {
+            'bytes=0-9': (0, 9),
+            'bytes=1000-': (1000, 1023),
+            'bytes=-24': (1000, 1023),
+            'bytes=1020-5000': (1020, 1023),
+        }
+        for header, (start, end) in cases.items():
+            with self.subTest(header=header):
+                response = self.get('posts/plain.jpg', HTTP_RANGE=header)
+                self.assertEqual(
+                    response.status_code, HTTPStatus.PARTIAL_CONTENT
+                )
+                self.assertEqual(
+                    b''.join(response.streaming_content),
+                    self.content[start:end + 1],
+                )
+                self.assertEqual(
+                    response['Content-Range'], f'bytes {start}-{end}/1024'
+                )
+
+    def test_unsatisfiable_range(self):
+        response = self.get('posts/plain.jpg', HTTP_RANGE='bytes=2000-')
+        self.assertEqual(
+            response.status_code, HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE
+        )
+        self.assertEqual(response['Content-Range'], 'bytes */1024')
+
+    def test_stale_if_range_returns_whole_file(self):
+        response = self.get(
+            'posts/plain.jpg', HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"old"'
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_conditional_requests(self):
+        first = self.get('posts/plain.jpg')
+        by_etag = self.get('posts/plain.jpg', HTTP_IF_NONE_MATCH=first['ETag'])
+        by_date = self.get(
+            'posts/plain.jpg', HTTP_IF_MODIFIED_SINCE=first['Last-Modified']
+        )
+        for response in (by_etag, by_date):
+            self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+            self.assertEqual(response['Cache-Control'], first['Cache-Control'])
+
+    def test_missing_and_outside_files(self):
+        for name in ('posts/missing.jpg', 'posts', '../settings.py'):
+            with self.subTest(name=name):
+                response = self.get(name)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    @override_settings(MEDIA_SERVE_MODE='x-accel-redirect')
+    def test_accel_redirect_offload(self):
+        response = self.get('posts/plain.jpg')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(
+            response['X-Accel-Redirect'],
+            settings.MEDIA_ACCEL_PREFIX + 'posts/plain.jpg',
+        )
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+
+    @override_settings(MEDIA_SERVE_MODE='x-sendfile')
+    def test_sendfile_offload(self):
+        response = self.get(HASHED_NAME)
+        self.assertEqual(
+            response['X-Sendfile'], os.path.join(TEMP_MEDIA_ROOT, HASHED_NAME)
+        )
+        self.assertEqual(response.content, b'')
@@ -0,0 +1,190 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import Future
+from http import HTTPStatus
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from posts.models import Post
+from posts.thumbnails import task_done, thumbnail_task
+from sorl.thumbnail import get_thumbnail
+
+from .. import metrics
+from ..page_cache import page_versions
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, METRICS_DIR=None)
+class MetricsTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+
+    def scrape(self):
+        return self.client.get(reverse('metrics')).content.decode()
+
+    def test_request_metrics(self):
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        text = self.scrape()
+        self.assertIn(
+            'yatube_requests_total'
+            '{method="GET",status="200",view="posts:index"} 2',
+            text,
+        )
+        self.assertIn(
+            'yatube_request_duration_seconds_count{view="posts:index"} 2',
+            text,
+        )
+        self.assertIn(
+            'yatube_request_duration_seconds_bucket'
+            '{view="posts:index",le="+Inf"} 2',
+            text,
+        )
+        self.assertIn('yatube_db_queries_count{view="posts:index"} 2', text)
+
+    def test_cache_hits_and_misses(self):
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        text = self.scrape()
+        self.assertIn(
+            'yatube_cache_requests_total{cache="index_feed",result="miss"} 1',
+            text,
+        )
+        self.assertIn(
+            'yatube_cache_requests_total{cache="index_feed",result="hit"} 1',
+            text,
+        )
+
+    def test_page_versions_counted_once_per_key(self):
+        page_versions('a', 'b')
+        page_versions('a', 'b')
+        text = self.scrape()
+        self.assertIn(
+            'yatube_cache_requests_total'
+            '{cache="page_version",result="miss"} 2',
+            text,
+        )
+        self.assertIn(
+            'yatube_cache_requests_total'
+            '{cache="page_version",result="hit"} 2',
+            text,
+        )
+
+    def test_thumbnail_generation_time(self):
+        user = User.objects.create_user(username='auth')
+        post = Post.objects.create(
+            author=user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+        get_thumbnail(post.image, '960x339', crop='center')
+        self.assertIn(
+            'yatube_thumbnail_duration_seconds_count{geometry="960x339"} 1',
+            self.scrape(),
+        )
+
+    def test_thumbnail_worker_metrics_reach_parent(self):
+        user = User.objects.create_user(username='auth')
+        post = Post.objects.create(
+            author=user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile('worker.gif', SMALL_GIF, 'image/gif'),
+        )
+        # thumbnail_task выполняется в рабочем процессе, task_done — в
+        # родителе; здесь оба в одном, но task забирает метрики себе.
+        result = thumbnail_task(post.image.name)
+        expected = 'yatube_thumbnail_duration_seconds_count{geometry='
+        self.assertNotIn(expected, self.scrape())
+        future = Future()
+        future.set_result(result)
+        task_done(future)
+        self.assertIn(expected, self.scrape())
+
+    def test_histogram_buckets_are_cumulative(self):
+        for value in (0.001, 0.02, 0.02, 30):
+            metrics.observe(
+                'yatube_request_duration_seconds', {'view': 'v'}, value
+            )
+        text = metrics.render()
+        for bound, expected in (('0.005', 1), ('0.025', 3), ('10', 3)):
+            with self.subTest(bound=bound):
+                self.assertIn(
+                    'yatube_request_duration_seconds_bucket'
+                    f'{{view="v",le="{bound}"}} {expected}',
+                    text,
+                )
+        self.assertIn(
+            'yatube_request_duration_seconds_bucket{view="v",le="+Inf"} 4',
+            text,
+        )
+
+    def write_snapshot(self, directory, pid, value):
+        data = {
+            'counters': [['yatube_requests_total', [['view', 'v']], value]],
+            'histograms': [],
+        }
+        with open(os.path.join(directory, f'{pid}.json'), 'w') as file:
+            json.dump(data, file)
+
+    def test_processes_are_aggregated_through_directory(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.write_snapshot(directory, os.getppid(), 3)
+            metrics.inc('yatube_requests_total', {'view': 'v'}, 2)
+            with self.settings(METRICS_DIR=directory):
+                text = metrics.render()
+        self.assertIn('yatube_requests_total{view="v"} 5', text)
+
+    def test_snapshots_of_finished_processes_are_dropped(self):
+        finished = subprocess.Popen([sys.executable, '-c', ''])
+        finished.wait()
+        with tempfile.TemporaryDirectory() as directory:
+            self.write_snapshot(directory, finished.pid, 3)
+            metrics.inc('yatube_requests_total', {'view': 'v'}, 2)
+            with self.settings(METRICS_DIR=directory):
+                text = metrics.render()
+            self.assertEqual(
+                os.listdir(directory), [f'{os.getpid()}.json']
+            )
+        self.assertIn('yatube_requests_total{view="v"} 2', text)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_endpoint_is_internal(self):
+        url = reverse('metrics')
+        outside = {'REMOTE_ADDR': '203.0.113.5'}
+        self.assertEqual(
+            self.client.get(url, **outside).status_code, HTTPStatus.NOT_FOUND
+        )
+        self.assertEqual(
+            self.client.get(
+                url, HTTP_AUTHORIZATION='Bearer wrong', **outside
+            ).status_code,
+            HTTPStatus.NOT_FOUND,
+        )
+        response = self.client.get(
+            url, HTTP_AUTHORIZATION='Bearer secret', **outside
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
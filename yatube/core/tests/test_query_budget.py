@@ -0,0 +1,62 @@
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from ..middleware import QueryBudgetMiddleware
+from ..query_budget import fingerprint
+
+User = get_user_model()
+
+
+@override_settings(
+    QUERY_BUDGET_SAMPLE_RATE=1.0,
+    QUERY_BUDGET_MAX_QUERIES=10,
+    QUERY_BUDGET_MAX_SQL_MS=1000,
+    QUERY_BUDGET_MAX_REPEATS=3,
+)
+class QueryBudgetMiddlewareTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.users = [
+            User.objects.create_user(username=f'user{number}')
+            for number in range(5)
+        ]
+
+    def run_middleware(self, queries):
+        def view(request):
+            for number in range(queries):
+                User.objects.filter(pk=self.users[number % 5].pk).exists()
+            return HttpResponse()
+
+        request = RequestFactory().get('/')
+        QueryBudgetMiddleware(view)(request)
+        return request
+
+    def test_fingerprint_ignores_list_length(self):
+        self.assertEqual(
+            fingerprint('SELECT 1 FROM t WHERE id IN (%s, %s) LIMIT 21'),
+            fingerprint('SELECT 1 FROM t WHERE id IN (%s) LIMIT 21'),
+        )
+
+    def test_repeated_queries_are_flagged(self):
+        with self.assertLogs('yatube.query_budget', 'WARNING') as logs:
+            request = self.run_middleware(queries=4)
+        self.assertEqual(request.query_stats.count, 4)
+        self.assertIn('N+1, 4 раз', logs.output[0])
+
+    def test_query_count_budget(self):
+        with self.settings(QUERY_BUDGET_MAX_REPEATS=100):
+            with self.assertLogs('yatube.query_budget', 'WARNING') as logs:
+                self.run_middleware(queries=11)
+        self.assertIn('11 запросов', logs.output[0])
+
+    def test_within_budget_logged_as_debug(self):
+        with self.assertLogs('yatube.query_budget', 'DEBUG') as logs:
+            self.run_middleware(queries=2)
+        self.assertTrue(logs.output[0].startswith('DEBUG'))
+
+    @override_settings(QUERY_BUDGET_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_not_recorded(self):
+        request = self.run_middleware(queries=4)
+        self.assertFalse(hasattr(request, 'query_stats'))
@@ -0,0 +1,97 @@
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from posts.models import Group, Post
+
+from ..routers import PIN_COOKIE, ReplicaRouter, read_only
+
+User = get_user_model()
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTest(TestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def routed(self, request):
+        """Куда ушло бы чтение изнутри view, помеченного @read_only."""
+
+        @read_only
+        def view(request):
+            return HttpResponse(self.router.db_for_read(Post))
+
+        return view(request).content.decode()
+
+    def test_reads_outside_views_go_to_primary(self):
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_read_only_get_goes_to_replica(self):
+        self.assertEqual(self.routed(self.factory.get('/')), 'replica')
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_unsafe_methods_go_to_primary(self):
+        self.assertEqual(self.routed(self.factory.post('/')), 'default')
+
+    def test_read_your_writes_window(self):
+        request = self.factory.get('/')
+        request.COOKIES[PIN_COOKIE] = str(time.time() + 10)
+        self.assertEqual(self.routed(request), 'default')
+        request.COOKIES[PIN_COOKIE] = str(time.time() - 10)
+        self.assertEqual(self.routed(request), 'replica')
+
+    def test_writes_go_to_primary(self):
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas_configured(self):
+        self.assertEqual(self.routed(self.factory.get('/')), 'default')
+
+
+@override_settings(DATABASE_REPLICAS=['default'])
+class ReadOnlyViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, text='Тестовый пост', group=cls.group
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_feed_views_read_from_replicas(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.user.username]),
+            reverse('posts:post_detail', args=[self.post.id]),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            with self.subTest(url=url), mock.patch(
+                'core.routers.random.choice', side_effect=lambda seq: seq[0]
+            ) as choice:
+                self.client.cookies.pop(PIN_COOKIE, None)
+                self.client.get(url)
+                self.assertTrue(choice.called)
+
+    def test_post_pins_client_to_primary(self):
+        response = self.client.post(
+            reverse('posts:add_comment', args=[self.post.id]),
+            data={'text': 'Комментарий'},
+        )
+        self.assertIn(PIN_COOKIE, response.cookies)
+        with mock.patch('core.routers.random.choice') as choice:
+            self.client.get(reverse('posts:post_detail', args=[self.post.id]))
+        choice.assert_not_called()
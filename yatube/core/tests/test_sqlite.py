@@ -0,0 +1,23 @@
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from ..sqlite import apply_pragmas, configure_sqlite
+
+
+class SqlitePragmasTest(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied_on_connect(self):
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        self.assertEqual(self.pragma('temp_store'), 2)
+        self.assertEqual(self.pragma('cache_size'), -64000)
+
+    def test_pragmas_come_from_settings(self):
+        with override_settings(SQLITE_PRAGMAS={'busy_timeout': 1234}):
+            configure_sqlite(sender=None, connection=connection)
+            self.assertEqual(self.pragma('busy_timeout'), 1234)
+        with connection.cursor() as cursor:
+            apply_pragmas(cursor, {'busy_timeout': 5000})
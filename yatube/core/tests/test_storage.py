@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+from posts.models import Post
+
+from ..models import StoredFile
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+User = get_user_model()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ContentAddressedStorageTest(TransactionTestCase):
+    # Транзакции фиксируются: файлы удаляются в on_commit.
+    small_gif = (
+        b'\x47\x49\x46\x38\x39\x61\x02\x00'
+        b'\x01\x00\x80\x00\x00\x00\x00\x00'
+        b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+        b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+        b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+        b'\x0A\x00\x3B'
+    )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='auth')
+        self.storage = Post._meta.get_field('image').storage
+
+    def create_post(self, name):
+        return Post.objects.create(
+            author=self.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(name, self.small_gif, 'image/gif'),
+        )
+
+    def references(self, name):
+        return StoredFile.objects.get(name=name).references
+
+    def test_name_is_sharded_content_hash(self):
+        post = self.create_post('Small.GIF')
+        directory, first, second, filename = post.image.name.split('/')
+        digest, extension = os.path.splitext(filename)
+        self.assertEqual(directory, 'posts')
+        self.assertEqual((first, second), (digest[:2], digest[2:4]))
+        self.assertEqual(len(digest), 64)
+        self.assertEqual(extension, '.gif')
+
+    def test_duplicates_are_stored_once(self):
+        first = self.create_post('first.gif')
+        second = self.create_post('second.gif')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(self.references(first.image.name), 2)
+        first.delete()
+        self.assertEqual(self.references(second.image.name), 1)
+        self.assertTrue(self.storage.exists(second.image.name))
+
+    def test_concurrent_duplicate_keeps_hashed_name(self):
+        first = self.create_post('first.gif')
+        # Второй запрос проверил exists() до того, как первый записал
+        # файл.
+        with mock.patch.object(self.storage, 'exists', return_value=False):
+            name, written = self.storage.store(
+                'posts/second.gif', ContentFile(self.small_gif)
+            )
+        self.assertEqual(name, first.image.name)
+        self.assertFalse(written)
+        self.assertEqual(self.references(name), 2)
+        directory = os.path.dirname(self.storage.path(name))
+        self.assertEqual(os.listdir(directory), [os.path.basename(name)])
+
+    def test_last_reference_removes_file(self):
+        post = self.create_post('single.gif')
+        name = post.image.name
+        post.image = SimpleUploadedFile('same.gif', self.small_gif)
+        post.save()
+        self.assertEqual(self.references(name), 1)
+        post.image = None
+        post.save()
+        self.assertFalse(StoredFile.objects.filter(name=name).exists())
+        self.assertFalse(self.storage.exists(name))
+
+    def test_migrate_media_moves_legacy_files(self):
+        for legacy in ('posts/old.gif', 'posts/copy.gif'):
+            path = os.path.join(TEMP_MEDIA_ROOT, legacy)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as legacy_file:
+                legacy_file.write(self.small_gif)
+            Post.objects.create(author=self.user, text='Старый', image=legacy)
+        Post.objects.create(
+            author=self.user, text='Без файла', image='posts/missing.gif'
+        )
+        call_command('migrate_media', batch_size=1, stdout=StringIO())
+        expected = self.storage.content_name(
+            'posts/old.gif', ContentFile(self.small_gif)
+        )
+        self.assertEqual(
+            set(Post.objects.values_list('image', flat=True)),
+            {expected, 'posts/missing.gif'},
+        )
+        self.assertEqual(self.references(expected), 2)
+        self.assertFalse(self.storage.exists('posts/old.gif'))
+        self.assertFalse(self.storage.exists('posts/copy.gif'))
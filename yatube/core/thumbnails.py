@@ -0,0 +1,23 @@
+"""Бэкенд sorl-thumbnail, замеряющий время генерации миниатюр."""
+import time
+
+from sorl.thumbnail.base import ThumbnailBackend
+
+from . import metrics
+
+
+class TimedThumbnailBackend(ThumbnailBackend):
+    def _create_thumbnail(
+        self, source_image, geometry_string, options, thumbnail
+    ):
+        started = time.perf_counter()
+        try:
+            return super()._create_thumbnail(
+                source_image, geometry_string, options, thumbnail
+            )
+        finally:
+            metrics.observe(
+                'yatube_thumbnail_duration_seconds',
+                {'geometry': geometry_string},
+                time.perf_counter() - started,
+            )
@@ -0,0 +1,85 @@
+"""Приём картинок без загрузки файлов в память процесса.
+
+Загрузка пишется на диск кусками по мере чтения запроса, формат и
+размеры проверяются по заголовку файла до какого-либо декодирования, а
+слишком большие оригиналы уменьшаются до IMAGE_MAX_EDGE, причём JPEG
+декодируется сразу в уменьшенном масштабе.
+"""
+import tempfile
+from functools import wraps
+
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from PIL import Image, ImageOps
+
+JPEG_QUALITY = 90
+
+
+def disk_uploads(view):
+    """Пишет файлы запроса во временные файлы на диске.
+
+    Обработчики загрузки можно заменить только до чтения request.POST,
+    а его читает проверка CSRF, поэтому она переносится внутрь.
+    """
+    protected = csrf_protect(view)
+
+    @csrf_exempt
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers = [TemporaryFileUploadHandler(request)]
+        return protected(request, *args, **kwargs)
+
+    return wrapper
+
+
+def check_image(uploaded, formats, max_size, max_pixels):
+    """Проверяет картинку по заголовку, уже прочитанному ImageField."""
+    width, height = uploaded.image.size
+    if uploaded.image.format not in formats:
+        raise ValidationError(
+            'Поддерживаются только форматы: %(formats)s.',
+            code='invalid_format',
+            params={'formats': ', '.join(formats)},
+        )
+    if uploaded.size > max_size:
+        raise ValidationError(
+            'Файл больше %(limit)d МБ.',
+            code='file_too_large',
+            params={'limit': max_size // 2 ** 20},
+        )
+    if width * height > max_pixels:
+        raise ValidationError(
+            'Картинка %(width)d×%(height)d слишком велика.',
+            code='too_many_pixels',
+            params={'width': width, 'height': height},
+        )
+
+
+def downsize_image(uploaded, max_edge):
+    """Возвращает копию картинки не шире max_edge или её саму.
+
+    Анимации не уменьшаются: кадры кроме первого были бы потеряны.
+    """
+    if hasattr(uploaded, 'temporary_file_path'):
+        source = uploaded.temporary_file_path()
+    else:
+        uploaded.seek(0)
+        source = uploaded
+    with Image.open(source) as image:
+        image_format = image.format
+        if max(image.size) <= max_edge or getattr(
+            image, 'is_animated', False
+        ):
+            return uploaded
+        image.draft(image.mode, (max_edge, max_edge))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        # Безымянный временный файл: его не переносят в хранилище, а
+        # копируют кусками, и он исчезает при закрытии без unlink.
+        resized = File(tempfile.TemporaryFile(), uploaded.name)
+        options = {'quality': JPEG_QUALITY} if image_format == 'JPEG' else {}
+        image.save(resized, image_format, **options)
+    resized.seek(0)
+    return resized
@@ -1,8 +1,27 @@
 from django.conf import settings
 from django.core.paginator import Paginator
 
+from .paginators import CachedCountPaginator, CursorPaginator
 
-def paginate_page(request, posts_list):
+
+def paginate_page(
+    request,
+    posts_list,
+    count_key=None,
+    count_list=None,
+    field='pub_date',
+    tiebreak='pk',
+):
+    if settings.PAGINATION_MODE == 'cursor' or 'cursor' in request.GET:
+        paginator = CursorPaginator(
+            posts_list, settings.LIMIT_POSTS, field, tiebreak
+        )
+        return paginator.get_page(request.GET.get('cursor'))
     page_number = request.GET.get('page')
-    paginator = Paginator(posts_list, settings.LIMIT_POSTS)
+    if count_key is None:
+        paginator = Paginator(posts_list, settings.LIMIT_POSTS)
+    else:
+        paginator = CachedCountPaginator(
+            posts_list, settings.LIMIT_POSTS, count_key, count_list
+        )
     return paginator.get_page(page_number)
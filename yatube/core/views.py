@@ -1,6 +1,11 @@
 from http import HTTPStatus
 
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+
+from . import metrics as collector
 
 
 def page_not_found(request, exception):
@@ -40,3 +45,23 @@ def internal_server_error(request, reason=''):
         context=context,
         status=HTTPStatus.INTERNAL_SERVER_ERROR,
     )
+
+
+def metrics_allowed(request):
+    if request.META.get('REMOTE_ADDR') in settings.INTERNAL_IPS:
+        return True
+    token = settings.METRICS_TOKEN
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    return bool(token) and constant_time_compare(
+        authorization, f'Bearer {token}'
+    )
+
+
+def metrics(request):
+    # Задержки и число запросов по view раскрывают устройство сайта,
+    # поэтому посторонним адрес не виден вовсе.
+    if not metrics_allowed(request):
+        raise Http404('Страница не найдена')
+    return HttpResponse(
+        collector.render(), content_type='text/plain; version=0.0.4'
+    )
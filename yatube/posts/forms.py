@@ -1,4 +1,7 @@
+from core.uploads import check_image, downsize_image
 from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
 
 from .models import Comment, Post
 
@@ -8,6 +11,19 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if not isinstance(image, UploadedFile):
+            # Картинка не менялась или её удалили.
+            return image
+        check_image(
+            image,
+            formats=settings.IMAGE_UPLOAD_FORMATS,
+            max_size=settings.IMAGE_UPLOAD_MAX_SIZE,
+            max_pixels=settings.IMAGE_UPLOAD_MAX_PIXELS,
+        )
+        return downsize_image(image, settings.IMAGE_MAX_EDGE)
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
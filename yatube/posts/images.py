@@ -0,0 +1,76 @@
+"""Сведения о картинке поста, которые лента выводит без чтения файла.
+
+Размеры, формат и вес файла берутся из заголовка при сохранении поста,
+а крошечная размытая превью-заглушка (LQIP) строится вместе с
+миниатюрами в пуле процессов: для неё картинку нужно декодировать.
+"""
+import base64
+import io
+
+from PIL import Image
+
+PLACEHOLDER_EDGE = 16
+PLACEHOLDER_QUALITY = 50
+
+EMPTY_METADATA = {
+    'image_width': None,
+    'image_height': None,
+    'image_format': '',
+    'image_size': None,
+    'image_placeholder': '',
+}
+
+
+def read_metadata(content):
+    """Размеры и формат из заголовка и вес файла в байтах."""
+    content.seek(0)
+    with Image.open(content) as image:
+        metadata = {
+            'image_width': image.width,
+            'image_height': image.height,
+            'image_format': image.format,
+            'image_size': content.size,
+        }
+    content.seek(0)
+    return metadata
+
+
+def make_placeholder(content):
+    """Data URI с JPEG не больше PLACEHOLDER_EDGE по большей стороне."""
+    content.seek(0)
+    with Image.open(content) as image:
+        # JPEG декодируется сразу в масштабе 1/8.
+        image.draft('RGB', (PLACEHOLDER_EDGE, PLACEHOLDER_EDGE))
+        image = image.convert('RGB')
+    image.thumbnail((PLACEHOLDER_EDGE, PLACEHOLDER_EDGE))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=PLACEHOLDER_QUALITY)
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/jpeg;base64,{encoded}'
+
+
+def file_metadata(name):
+    """Все поля метаданных для файла name из хранилища Post.image."""
+    from .models import Post
+
+    storage = Post._meta.get_field('image').storage
+    with storage.open(name) as content:
+        return {
+            **read_metadata(content),
+            'image_placeholder': make_placeholder(content),
+        }
+
+
+def store_metadata(name):
+    """Записывает метаданные постам с картинкой name.
+
+    Как и generate_thumbnails, выполняется в рабочих процессах и
+    возвращает текст ошибки вместо исключения.
+    """
+    from .models import Post
+
+    try:
+        Post.objects.filter(image=name).update(**file_metadata(name))
+    except Exception as error:
+        return f'{name}: {error}'
+    return None
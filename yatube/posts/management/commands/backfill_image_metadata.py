@@ -0,0 +1,64 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from posts.images import store_metadata
+from posts.models import Post
+from posts.thumbnails import can_use_pool, make_executor
+
+
+class Command(BaseCommand):
+    help = (
+        'Записывает размеры, формат, вес и заглушку картинкам постов, '
+        'у которых их ещё нет. Файлы читаются в пуле процессов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='0 — читать файлы в текущем процессе',
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            dest='refresh',
+            help='Пересчитать метаданные и у заполненных постов',
+        )
+        parser.add_argument('--chunk-size', type=int, default=16)
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['refresh']:
+            posts = posts.filter(image_placeholder='')
+        names = posts.order_by().values_list('image', flat=True).distinct()
+        started = time.perf_counter()
+        if options['workers'] and can_use_pool():
+            with make_executor(options['workers']) as executor:
+                total, failed = self.report_errors(
+                    executor.map(
+                        store_metadata,
+                        names.iterator(),
+                        chunksize=options['chunk_size'],
+                    )
+                )
+        else:
+            total, failed = self.report_errors(
+                map(store_metadata, names.iterator())
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Картинок: {total}, ошибок: {failed}, '
+                f'{time.perf_counter() - started:.1f} с'
+            )
+        )
+
+    def report_errors(self, results):
+        total = failed = 0
+        for error in results:
+            total += 1
+            if error:
+                failed += 1
+                self.stderr.write(error)
+        return total, failed
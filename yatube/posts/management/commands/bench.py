@@ -0,0 +1,319 @@
+import json
+import platform
+import random
+import time
+from collections import Counter
+
+import django
+from core.benchmarks import isolated_database, summarize
+from core.middleware import QueryCounter
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import (
+    setup_test_environment,
+    teardown_test_environment,
+)
+from django.urls import get_resolver, reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from django.utils.timezone import now
+from faker import Faker
+from posts.models import Comment, Follow, Group, Post
+from posts.stats import recount_stats
+from posts.timeline import rebuild_timeline
+
+User = get_user_model()
+
+NAMESPACES = ('posts', 'users', 'about')
+# Изменяющие запросы замеряются отдельно от GET тех же адресов.
+POSTS = {
+    'posts:add_comment': lambda fake: {'text': fake.sentence()},
+    'posts:post_create': lambda fake: {'text': fake.paragraph()},
+}
+
+
+def zipf_weights(size, alpha):
+    return [1 / rank ** alpha for rank in range(1, size + 1)]
+
+
+def power_law_edges(users, edges, alpha, rng):
+    """Рёбра подписок: популярность авторов убывает по закону Ципфа."""
+    authors = users[:]
+    rng.shuffle(authors)
+    weights = zipf_weights(len(authors), alpha)
+    pairs = set()
+    # Ограничение попыток: при плотном графе нужных пар может не хватить.
+    for _ in range(edges * 10):
+        if len(pairs) >= edges:
+            break
+        user = rng.choice(users)
+        (author,) = rng.choices(authors, weights)
+        if user != author:
+            pairs.add((user, author))
+    return sorted(pairs)
+
+
+class Dataset:
+    """Синтетические пользователи, группы, посты, комментарии, подписки."""
+
+    def __init__(self, options):
+        self.rng = random.Random(options['seed'])
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(options['seed'])
+        password = make_password(None)
+        User.objects.bulk_create(
+            User(username=f'user{number}', password=password)
+            for number in range(options['users'])
+        )
+        self.users = list(User.objects.values_list('id', flat=True))
+        self.usernames = list(User.objects.values_list('username', flat=True))
+        Group.objects.bulk_create(
+            Group(
+                title=self.fake.sentence(nb_words=3)[:200],
+                slug=f'group{number}',
+                description=self.fake.paragraph(),
+            )
+            for number in range(options['groups'])
+        )
+        self.groups = list(Group.objects.values_list('id', flat=True))
+        self.slugs = list(Group.objects.values_list('slug', flat=True))
+        edges = power_law_edges(
+            self.users, options['follows'], options['alpha'], self.rng
+        )
+        Follow.objects.bulk_create(
+            (Follow(user_id=user, author_id=author) for user, author in edges),
+            batch_size=500,
+        )
+        # Популярные авторы пишут больше: посты раздаются с теми же
+        # весами, что и подписки.
+        writers = self.rng.choices(
+            self.users,
+            zipf_weights(len(self.users), options['alpha']),
+            k=options['posts'],
+        )
+        Post.objects.bulk_create(
+            (
+                Post(
+                    author_id=author,
+                    group_id=self.rng.choice(self.groups + [None]),
+                    text=self.fake.paragraph(nb_sentences=5),
+                )
+                for author in writers
+            ),
+            batch_size=500,
+        )
+        self.posts = list(Post.objects.values_list('id', flat=True))
+        Comment.objects.bulk_create(
+            (
+                Comment(
+                    post_id=self.rng.choice(self.posts),
+                    author_id=self.rng.choice(self.users),
+                    text=self.fake.sentence(),
+                )
+                for _ in range(options['comments'])
+            ),
+            batch_size=500,
+        )
+        recount_stats()
+        rebuild_timeline()
+        cache.clear()
+        # Лента подписок замеряется у самого активного читателя.
+        followings = Counter(user for user, _ in edges)
+        reader_id = followings.most_common(1)[0][0] if edges else self.users[0]
+        self.reader = User.objects.get(pk=reader_id)
+        self.token_user = User.objects.order_by('pk').first()
+
+    def kwargs(self, pattern):
+        """Случайные аргументы для адреса из данных набора."""
+        values = {
+            'slug': lambda: self.rng.choice(self.slugs),
+            'username': lambda: self.rng.choice(self.usernames),
+            'post_id': lambda: self.rng.choice(self.posts),
+            'uidb64': lambda: urlsafe_base64_encode(
+                force_bytes(self.token_user.pk)
+            ),
+            'token': lambda: default_token_generator.make_token(
+                self.token_user
+            ),
+        }
+        kwargs = {}
+        for name in pattern.pattern.converters:
+            if name not in values:
+                raise CommandError(
+                    f'Нет данных для аргумента {name} адреса {pattern.name}'
+                )
+            kwargs[name] = values[name]()
+        return kwargs
+
+
+def url_patterns():
+    """Все именованные адреса из NAMESPACES в порядке объявления."""
+    resolver = get_resolver()
+    for namespace in NAMESPACES:
+        _, included = resolver.namespace_dict[namespace]
+        for pattern in included.url_patterns:
+            if pattern.name:
+                yield f'{namespace}:{pattern.name}', pattern
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный замер всех адресов posts, users и about на '
+        'синтетических данных во временной базе: p50/p95/p99, число '
+        'SQL-запросов и пропускная способность. Результат сохраняется '
+        'в JSON и сравнивается с базовым замером.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--groups', type=int, default=10)
+        parser.add_argument('--posts', type=int, default=2000)
+        parser.add_argument('--comments', type=int, default=5000)
+        parser.add_argument('--follows', type=int, default=2000)
+        parser.add_argument(
+            '--alpha',
+            type=float,
+            default=1.2,
+            help='Показатель степенного распределения популярности',
+        )
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--output', help='Куда записать JSON')
+        parser.add_argument('--baseline', help='JSON прошлого замера')
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=20,
+            help='Рост p95 в процентах, считающийся регрессией',
+        )
+        parser.add_argument(
+            '--fail-on-regression',
+            action='store_true',
+            help='Завершиться с ошибкой при регрессии',
+        )
+
+    def handle(self, *args, **options):
+        setup_test_environment(debug=False)
+        try:
+            with isolated_database():
+                started = time.perf_counter()
+                dataset = Dataset(options)
+                self.stderr.write(
+                    f'Данные созданы за {time.perf_counter() - started:.1f} с'
+                )
+                results = self.run_scenarios(dataset, options)
+        finally:
+            teardown_test_environment()
+        report = {
+            'meta': {
+                'created': now().isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'dataset': {
+                    name: options[name]
+                    for name in (
+                        'users',
+                        'groups',
+                        'posts',
+                        'comments',
+                        'follows',
+                        'alpha',
+                        'seed',
+                    )
+                },
+                'repeat': options['repeat'],
+            },
+            'results': results,
+        }
+        self.print_results(results)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+        if options['baseline']:
+            self.compare(results, options)
+
+    def scenarios(self, dataset):
+        """(имя, метод, адрес-функция, данные-функция) для замера."""
+        for name, pattern in url_patterns():
+
+            def url(name=name, pattern=pattern):
+                return reverse(name, kwargs=dataset.kwargs(pattern))
+
+            yield name, 'GET', url, None
+            if name in POSTS:
+                yield f'{name} POST', 'POST', url, POSTS[name]
+
+    def run_scenarios(self, dataset, options):
+        client = Client()
+        client.force_login(dataset.reader)
+        results = {}
+        for name, method, url, data in self.scenarios(dataset):
+            samples, queries, statuses = [], [], set()
+            for iteration in range(options['warmup'] + options['repeat']):
+                if name == 'users:logout':
+                    client.force_login(dataset.reader)
+                target = url()
+                payload = data(dataset.fake) if data else None
+                counter = QueryCounter()
+                with connection.execute_wrapper(counter):
+                    started = time.perf_counter()
+                    if method == 'POST':
+                        response = client.post(target, payload)
+                    else:
+                        response = client.get(target)
+                    elapsed = (time.perf_counter() - started) * 1000
+                if iteration < options['warmup']:
+                    continue
+                samples.append(elapsed)
+                queries.append(counter.count)
+                statuses.add(response.status_code)
+            client.force_login(dataset.reader)
+            results[name] = {
+                **summarize(samples),
+                'queries_mean': round(sum(queries) / len(queries), 2),
+                'queries_max': max(queries),
+                'rps': round(1000 * len(samples) / sum(samples), 1),
+                'statuses': sorted(statuses),
+            }
+        return results
+
+    def print_results(self, results):
+        self.stdout.write(
+            f'{"адрес":<36} {"p50":>8} {"p95":>8} {"p99":>8} '
+            f'{"SQL":>6} {"зап/с":>8}'
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<36} {result["p50"]:>8} {result["p95"]:>8} '
+                f'{result["p99"]:>8} {result["queries_mean"]:>6} '
+                f'{result["rps"]:>8}'
+            )
+
+    def compare(self, results, options):
+        with open(options['baseline'], encoding='utf-8') as file:
+            baseline = json.load(file)['results']
+        regressions = []
+        for name, result in results.items():
+            if name not in baseline:
+                continue
+            before = baseline[name]
+            change = (result['p95'] - before['p95']) / before['p95'] * 100
+            more_queries = result['queries_max'] > before['queries_max']
+            line = (
+                f'{name:<36} p95 {before["p95"]} -> {result["p95"]} мс '
+                f'({change:+.0f}%), SQL {before["queries_max"]} -> '
+                f'{result["queries_max"]}'
+            )
+            if change > options['threshold'] or more_queries:
+                regressions.append(name)
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f'Регрессии: {", ".join(regressions)}')
@@ -0,0 +1,88 @@
+import random
+
+from core.benchmarks import isolated_database, measure, summarize
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from posts.merge_feed import MergedFeedPaginator
+from posts.models import Follow, Post
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает первую страницу ленты подписок: join-запрос против '
+        'слияния кэшированных списков авторов. Замер идёт на временной '
+        'тестовой базе.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--authors', type=int, nargs='+', default=[10, 100, 1000]
+        )
+        parser.add_argument('--posts-per-author', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            for authors_count in options['authors']:
+                self.bench(
+                    authors_count,
+                    options['posts_per_author'],
+                    options['repeat'],
+                )
+
+    def bench(self, authors_count, posts_per_author, repeat):
+        reader = self.populate(authors_count, posts_per_author)
+
+        def join_query():
+            list(
+                Post.objects.filter(author__following__user=reader)
+                .select_related('author', 'group')[: settings.LIMIT_POSTS]
+            )
+
+        def merge():
+            paginator = MergedFeedPaginator(reader, settings.LIMIT_POSTS)
+            list(paginator.get_page(None))
+
+        def merge_cold():
+            cache.clear()
+            merge()
+
+        merge()
+        for name, func in (
+            ('join', join_query),
+            ('merge', merge),
+            ('merge (холодный кэш)', merge_cold),
+        ):
+            stats = summarize(measure(func, repeat))
+            self.stdout.write(
+                f'{authors_count:>5} авторов  {name:<22}'
+                f' p50={stats["p50"]} мс  p95={stats["p95"]} мс'
+            )
+
+    def populate(self, authors_count, posts_per_author):
+        """Читатель, его авторы и столько же авторов без подписки."""
+        prefix = f'bench{authors_count}'
+        reader = User.objects.create_user(username=f'{prefix}_reader')
+        User.objects.bulk_create(
+            User(username=f'{prefix}_author{i}')
+            for i in range(authors_count * 2)
+        )
+        authors = list(
+            User.objects.filter(username__startswith=f'{prefix}_author')
+        )
+        posts = [
+            Post(author=author, text=f'Пост {i}')
+            for author in authors
+            for i in range(posts_per_author)
+        ]
+        random.shuffle(posts)
+        Post.objects.bulk_create(posts, batch_size=500)
+        Follow.objects.bulk_create(
+            Follow(user=reader, author=author)
+            for author in authors[:authors_count]
+        )
+        return reader
@@ -0,0 +1,329 @@
+import csv
+import gzip
+import io
+import json
+import sys
+import time
+from contextlib import contextmanager
+from itertools import islice
+
+from core.counters import feed_count_key, reset_count
+from core.page_cache import bump_page_versions
+from core.storage import recount_references
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import now
+from posts.merge_feed import recent_posts_key
+from posts.models import Comment, Follow, Group, Post
+from posts.stats import recount_stats, scoped
+from posts.timeline import rebuild_timeline
+
+User = get_user_model()
+
+TYPES = ('post', 'comment', 'follow')
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Временно отключает auto_now/auto_now_add у полей.
+
+    Иначе bulk_create перезапишет даты из исходной платформы текущим
+    временем.
+    """
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def open_text(path):
+    if path == '-':
+        return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+
+def read_rows(stream, file_format):
+    if file_format == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает посты, комментарии и подписки из JSONL или CSV '
+        'порциями bulk_create. Авторы указываются по username, группы — '
+        'по slug, пост комментария — по id. Строка с полем type '
+        '(post, comment, follow) может переопределить --type.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл (.jsonl, .csv, .gz) или -')
+        parser.add_argument('--type', choices=TYPES)
+        parser.add_argument('--format', choices=('jsonl', 'csv'))
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--create-users',
+            action='store_true',
+            help='Создавать неизвестных авторов без пароля',
+        )
+        parser.add_argument(
+            '--ignore-existing',
+            action='store_true',
+            help='Пропускать посты и комментарии с уже занятыми id, '
+            'чтобы продолжить прерванную загрузку',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        name = path[: -len('.gz')] if path.endswith('.gz') else path
+        file_format = options['format'] or (
+            'csv' if name.endswith('.csv') else 'jsonl'
+        )
+        self.verbosity = options['verbosity']
+        self.default_type = options['type']
+        self.create_users = options['create_users']
+        self.ignore_existing = options['ignore_existing']
+        self.users = dict(User.objects.values_list('username', 'id'))
+        self.groups = dict(Group.objects.values_list('slug', 'id'))
+        self.post_ids = None
+        # Что затронула загрузка: по этим наборам finish() пересчитывает
+        # счётчики и сбрасывает кэш, не трогая остальные данные.
+        self.authors = set()
+        self.touched_users = set()
+        self.touched_groups = set()
+        self.commented = set()
+        self.followers = set()
+        self.followed = set()
+        self.images = set()
+        self.loaded = dict.fromkeys(TYPES, 0)
+        self.skipped = 0
+        started = time.perf_counter()
+        with open_text(path) as stream, explicit_dates(
+            Post._meta.get_field('pub_date'),
+            Post._meta.get_field('updated'),
+            Comment._meta.get_field('created'),
+        ):
+            rows = read_rows(stream, file_format)
+            start = 0
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                try:
+                    with transaction.atomic():
+                        self.import_batch(batch)
+                except IntegrityError as error:
+                    # Предыдущие порции уже записаны: досчитываем их
+                    # счётчики, чтобы повторный запуск начинался с
+                    # согласованных данных.
+                    self.finish()
+                    raise CommandError(
+                        f'Строки {start + 1}–{start + len(batch)} не '
+                        f'загружены: {error}. Чтобы продолжить загрузку, '
+                        'запустите команду с --ignore-existing.'
+                    ) from error
+                start += len(batch)
+                self.report(started, final=False)
+        self.finish()
+        self.report(started, final=True)
+
+    def import_batch(self, batch):
+        by_type = {row_type: [] for row_type in TYPES}
+        for row in batch:
+            row_type = row.get('type') or self.default_type
+            if row_type not in by_type:
+                raise CommandError(f'Неизвестный тип строки: {row}')
+            by_type[row_type].append(row)
+        self.resolve_users(
+            name
+            for rows in by_type.values()
+            for row in rows
+            for name in (row.get('author'), row.get('user'))
+            if name
+        )
+        # Посты идут первыми: комментарии той же порции могут на них
+        # ссылаться.
+        posts = self.load(
+            Post,
+            map(self.build_post, by_type['post']),
+            ignore_conflicts=self.ignore_existing,
+        )
+        if self.post_ids is not None:
+            self.post_ids.update(post.pk for post in posts if post.pk)
+        self.load(
+            Comment,
+            map(self.build_comment, by_type['comment']),
+            ignore_conflicts=self.ignore_existing,
+        )
+        self.load(
+            Follow,
+            map(self.build_follow, by_type['follow']),
+            ignore_conflicts=True,
+        )
+
+    def resolve_users(self, usernames):
+        missing = set(usernames) - self.users.keys()
+        if not missing or not self.create_users:
+            return
+        password = make_password(None)
+        User.objects.bulk_create(
+            User(username=username, password=password)
+            for username in missing
+        )
+        self.touched_users |= missing
+        self.users.update(
+            User.objects.filter(username__in=missing).values_list(
+                'username', 'id'
+            )
+        )
+
+    def load(self, model, objects, **kwargs):
+        objects = [obj for obj in objects if obj is not None]
+        if objects:
+            model.objects.bulk_create(objects, **kwargs)
+            self.loaded[model.__name__.lower()] += len(objects)
+        return objects
+
+    def skip(self, row, reason):
+        self.skipped += 1
+        if self.verbosity > 1:
+            self.stderr.write(f'Пропущена строка ({reason}): {row}')
+
+    def parse_date(self, value, default=None):
+        return (parse_datetime(value) if value else None) or default or now()
+
+    def build_post(self, row):
+        author_id = self.users.get(row.get('author'))
+        if author_id is None:
+            return self.skip(row, 'неизвестный автор')
+        group_id = None
+        if row.get('group'):
+            group_id = self.groups.get(row['group'])
+            if group_id is None:
+                return self.skip(row, 'неизвестная группа')
+        if not row.get('text'):
+            return self.skip(row, 'нет текста')
+        pub_date = self.parse_date(row.get('pub_date'))
+        self.authors.add(row['author'])
+        if group_id is not None:
+            self.touched_groups.add(row['group'])
+        if row.get('image'):
+            self.images.add(row['image'])
+        return Post(
+            id=row.get('id') or None,
+            text=row['text'],
+            author_id=author_id,
+            group_id=group_id,
+            image=row.get('image') or '',
+            pub_date=pub_date,
+            updated=self.parse_date(row.get('updated'), pub_date),
+        )
+
+    def build_comment(self, row):
+        author_id = self.users.get(row.get('author'))
+        if author_id is None:
+            return self.skip(row, 'неизвестный автор')
+        try:
+            post_id = int(row.get('post'))
+        except (TypeError, ValueError):
+            return self.skip(row, 'неизвестный пост')
+        if not self.post_exists(post_id):
+            return self.skip(row, 'неизвестный пост')
+        if not row.get('text'):
+            return self.skip(row, 'нет текста')
+        self.commented.add(post_id)
+        return Comment(
+            id=row.get('id') or None,
+            post_id=post_id,
+            author_id=author_id,
+            text=row['text'],
+            created=self.parse_date(row.get('created')),
+        )
+
+    def build_follow(self, row):
+        user_id = self.users.get(row.get('user'))
+        author_id = self.users.get(row.get('author'))
+        if user_id is None or author_id is None:
+            return self.skip(row, 'неизвестный пользователь')
+        if user_id == author_id:
+            return self.skip(row, 'подписка на себя')
+        self.followers.add(row['user'])
+        self.followed.add(row['author'])
+        return Follow(user_id=user_id, author_id=author_id)
+
+    def post_exists(self, post_id):
+        # Множество id постов строится один раз и пополняется
+        # загруженными постами, чтобы не проверять каждый комментарий
+        # отдельным запросом.
+        if self.post_ids is None:
+            self.post_ids = set(Post.objects.values_list('id', flat=True))
+        return post_id in self.post_ids
+
+    def finish(self):
+        """Восстанавливает то, что bulk_create делает в обход сигналов.
+
+        Пересчитываются и сбрасываются только счётчики, ленты и страницы
+        затронутых авторов, групп и постов, поэтому небольшая
+        дозагрузка не стоит полного пересчёта и холодного кэша.
+        """
+        self.touched_users |= self.authors | self.followers | self.followed
+        author_ids = self.user_ids(self.authors)
+        follower_ids = self.user_ids(self.followers)
+        group_ids = [self.groups[slug] for slug in self.touched_groups]
+        recount_stats(
+            user_ids=self.user_ids(self.touched_users),
+            group_ids=group_ids,
+            post_ids=self.commented,
+        )
+        recount_references(self.images)
+        if settings.FOLLOW_FEED_ENGINE == 'timeline':
+            rebuild_timeline(author_ids=author_ids, user_ids=follower_ids)
+        readers = set(follower_ids)
+        for follows in scoped(Follow.objects.all(), 'author_id', author_ids):
+            readers.update(follows.values_list('user_id', flat=True))
+        reset_count(
+            *(feed_count_key('author', pk) for pk in author_ids),
+            *(feed_count_key('group', pk) for pk in group_ids),
+            *(feed_count_key('follow', pk) for pk in readers),
+        )
+        cache.delete_many([recent_posts_key(pk) for pk in author_ids])
+        if self.authors:
+            reset_count(feed_count_key('index'))
+            bump_page_versions('index')
+        bump_page_versions(
+            *(f'profile:{username}' for username in self.authors),
+            *(f'group:{slug}' for slug in self.touched_groups),
+            *(f'followers:{username}' for username in self.followed),
+        )
+
+    def user_ids(self, usernames):
+        return [self.users[username] for username in usernames]
+
+    def report(self, started, final):
+        elapsed = time.perf_counter() - started
+        total = sum(self.loaded.values())
+        if not final and self.verbosity < 2:
+            return
+        loaded = ', '.join(
+            f'{name}: {count}' for name, count in self.loaded.items()
+        )
+        message = (
+            f'{loaded}; пропущено: {self.skipped}; '
+            f'{total / elapsed if elapsed else 0:.0f} строк/с '
+            f'за {elapsed:.1f} с'
+        )
+        self.stdout.write(self.style.SUCCESS(message) if final else message)
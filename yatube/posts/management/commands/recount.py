@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+from posts.stats import recount_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает денормализованные счётчики постов, комментариев '
+        'и подписок по данным таблиц.'
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        recount_stats()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Счётчики пересчитаны за '
+                f'{time.perf_counter() - started:.2f} с'
+            )
+        )
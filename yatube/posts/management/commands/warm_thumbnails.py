@@ -0,0 +1,55 @@
+import os
+import time
+from functools import partial
+
+from django.core.management.base import BaseCommand
+from posts.models import Post
+from posts.thumbnails import make_executor, task_result, thumbnail_task
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит миниатюры всех картинок постов в пуле процессов, например '
+        'после деплоя или смены размеров миниатюр.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересоздать уже существующие миниатюры',
+        )
+        parser.add_argument('--chunk-size', type=int, default=16)
+
+    def handle(self, *args, **options):
+        names = (
+            Post.objects.exclude(image='')
+            .exclude(image__isnull=True)
+            .order_by()
+            .values_list('image', flat=True)
+            .distinct()
+        )
+        started = time.perf_counter()
+        total = failed = 0
+        with make_executor(options['workers']) as executor:
+            results = executor.map(
+                partial(thumbnail_task, force=options['force']),
+                names.iterator(),
+                chunksize=options['chunk_size'],
+            )
+            for result in results:
+                error = task_result(result)
+                total += 1
+                if error:
+                    failed += 1
+                    self.stderr.write(error)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Картинок: {total}, ошибок: {failed}, '
+                f'{elapsed:.1f} с, {total / elapsed if elapsed else 0:.1f}/с'
+            )
+        )
@@ -0,0 +1,123 @@
+"""Лента подписок, собираемая при чтении (fan-out on read).
+
+Для каждого автора в кэше лежит короткий список последних пар
+(pub_date, id). Страница ленты получается k-way слиянием списков
+авторов, на которых подписан читатель, после чего сами посты читаются
+одним запросом по id. Если кэшированной глубины не хватает для точного
+ответа, страница строится обычным join-запросом.
+"""
+import heapq
+from itertools import islice
+
+from core.paginators import PREVIOUS, CursorPaginator
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import OuterRef, Subquery
+from django.utils.functional import cached_property
+
+from .models import Follow, Post
+
+
+def recent_posts_key(author_id):
+    return f'recent_posts:{author_id}'
+
+
+def recent_posts(author_ids):
+    """Последние (pub_date, id) каждого автора по убыванию.
+
+    Списки, которых нет в кэше, выбираются одним запросом с
+    коррелированным подзапросом на автора.
+    """
+    keys = {recent_posts_key(author_id): author_id for author_id in author_ids}
+    lists = cache.get_many(keys)
+    missing = {
+        author_id: [] for key, author_id in keys.items() if key not in lists
+    }
+    if missing:
+        latest = Post.objects.filter(author_id=OuterRef('author_id')).order_by(
+            '-pub_date', '-id'
+        )
+        latest_rows = (
+            Post.objects.filter(
+                author_id__in=missing,
+                id__in=Subquery(
+                    latest.values('id')[: settings.FOLLOW_FEED_DEPTH]
+                ),
+            )
+            .order_by('-pub_date', '-id')
+            .values_list('author_id', 'pub_date', 'id')
+        )
+        for author_id, pub_date, post_id in latest_rows:
+            missing[author_id].append((pub_date, post_id))
+        missing = {
+            recent_posts_key(author_id): rows
+            for author_id, rows in missing.items()
+        }
+        cache.set_many(missing, settings.FOLLOW_FEED_TIMEOUT)
+        lists.update(missing)
+    return list(lists.values())
+
+
+def merge_window(lists, direction, key, limit):
+    """Сливает списки авторов в окно из limit ключей за позицией key.
+
+    Возвращает None, если окно уходит глубже горизонта — самого свежего
+    из последних элементов обрезанных списков: ниже него кэш может не
+    знать о части постов.
+    """
+    depth = settings.FOLLOW_FEED_DEPTH
+    horizon = max(
+        (rows[-1] for rows in lists if len(rows) >= depth), default=None
+    )
+    if direction == PREVIOUS:
+        if horizon is not None and key < horizon:
+            return None
+        streams = [
+            reversed([row for row in rows if row > key]) for rows in lists
+        ]
+        return list(islice(heapq.merge(*streams), limit))
+    if direction is not None:
+        lists = [[row for row in rows if row < key] for rows in lists]
+    window = list(islice(heapq.merge(*lists, reverse=True), limit))
+    if horizon is not None and (len(window) < limit or window[-1] < horizon):
+        return None
+    return window
+
+
+class MergedFeedPaginator(CursorPaginator):
+    """Курсорный пагинатор ленты подписок со слиянием при чтении."""
+
+    def __init__(self, user, per_page):
+        super().__init__(
+            Post.objects.filter(author__following__user=user)
+            .select_related('author', 'group')
+            .prefetch_related('image_variants'),
+            per_page,
+        )
+        self.user = user
+
+    @cached_property
+    def author_ids(self):
+        return list(
+            Follow.objects.filter(user=self.user).values_list(
+                'author_id', flat=True
+            )
+        )
+
+    def window(self, direction, value, pk, limit):
+        keys = merge_window(
+            recent_posts(self.author_ids), direction, (value, pk), limit
+        )
+        if keys is None:
+            return super().window(direction, value, pk, limit)
+        posts = (
+            Post.objects.select_related('author', 'group')
+            .prefetch_related('image_variants')
+            .in_bulk([post_id for _, post_id in keys])
+        )
+        return [posts[post_id] for _, post_id in keys if post_id in posts]
+
+
+def merged_follow_page(request):
+    paginator = MergedFeedPaginator(request.user, settings.LIMIT_POSTS)
+    return paginator.get_page(request.GET.get('cursor'))
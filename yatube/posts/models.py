@@ -1,5 +1,7 @@
+from core.storage import ContentAddressedStorage
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.utils.functional import cached_property
 
 User = get_user_model()
 
@@ -10,6 +12,9 @@ class Group(models.Model):
         unique=True, verbose_name='Имя группы в формате  slug'
     )
     description = models.TextField(verbose_name='Описание группы')
+    posts_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Число постов'
+    )
 
     def __str__(self) -> str:
         return f'<Группа: {self.title}>'
@@ -26,6 +31,9 @@ class Post(models.Model):
     pub_date = models.DateTimeField(
         auto_now_add=True, verbose_name='Дата публикации'
     )
+    updated = models.DateTimeField(
+        auto_now=True, verbose_name='Дата изменения'
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -44,16 +52,81 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True,
         null=True,
         help_text='Прикрепите картинку для загрузки',
     )
+    # Сведения о картинке для ленты: с ними <img> получает размеры и
+    # заглушку без обращения к хранилищу (см. posts.images).
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки', null=True, blank=True, editable=False
+    )
+    image_height = models.PositiveIntegerField(
+        'Высота картинки', null=True, blank=True, editable=False
+    )
+    image_format = models.CharField(
+        'Формат картинки', max_length=10, blank=True, editable=False
+    )
+    image_size = models.PositiveIntegerField(
+        'Размер картинки, байт', null=True, blank=True, editable=False
+    )
+    image_placeholder = models.TextField(
+        'Заглушка картинки', blank=True, editable=False
+    )
+    comments_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Число комментариев'
+    )
 
     def __str__(self) -> str:
         return f'{self.text[:15]}'
 
+    @cached_property
+    def image_variant_list(self):
+        # Список, а не queryset: шаблон обращается к вариантам трижды,
+        # и без prefetch_related каждое обращение было бы запросом.
+        return list(self.image_variants.all())
+
+    def image_srcset(self, image_format):
+        return ', '.join(
+            f'{variant.image.url} {variant.width}w'
+            for variant in self.image_variant_list
+            if variant.format == image_format
+        )
+
+    @property
+    def image_srcset_webp(self):
+        return self.image_srcset(PostImageVariant.WEBP)
+
+    @property
+    def image_srcset_jpeg(self):
+        return self.image_srcset(PostImageVariant.JPEG)
+
+    @property
+    def image_fallback(self):
+        """Самый широкий JPEG-вариант для src и размеров <img>."""
+        jpegs = [
+            variant
+            for variant in self.image_variant_list
+            if variant.format == PostImageVariant.JPEG
+        ]
+        return max(jpegs, key=lambda variant: variant.width, default=None)
+
     class Meta:
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
+        # Индексы повторяют пути чтения лент: главная, группа и профиль
+        # отдаются диапазонным просмотром без сортировки.
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'], name='post_date_idx'),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_date_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_date_idx',
+            ),
+        ]
         verbose_name = 'Публикация'
         verbose_name_plural = 'Публикации'
 
@@ -82,7 +155,13 @@ class Comment(models.Model):
         return f'{self.text[:15]}'
 
     class Meta:
-        ordering = ('-created',)
+        ordering = ('-created', '-id')
+        indexes = [
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='comment_post_created_idx',
+            ),
+        ]
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
 
@@ -106,5 +185,115 @@ class Follow(models.Model):
 
     class Meta:
         unique_together = ['user', 'author']
+        # Обратный индекс: подписчики автора нужны при публикации поста.
+        indexes = [
+            models.Index(
+                fields=['author', 'user'], name='follow_author_user_idx'
+            ),
+        ]
         verbose_name = 'Подписчик'
         verbose_name_plural = 'Подписчики'
+
+
+class TimelineEntry(models.Model):
+    """Материализованная лента подписок: строка на пару читатель-пост."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Публикация',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор публикации',
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    def __str__(self):
+        return f'{self.user} <- {self.post_id}'
+
+    class Meta:
+        unique_together = ['user', 'post']
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_date_idx',
+            ),
+            models.Index(
+                fields=['user', 'author'], name='timeline_user_author_idx'
+            ),
+        ]
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Записи ленты подписок'
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики пользователя.
+
+    Обновляются сигналами через F()-выражения, восстанавливаются
+    командой manage.py recount.
+    """
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0, verbose_name='Число постов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0, verbose_name='Число подписчиков'
+    )
+    following_count = models.PositiveIntegerField(
+        default=0, verbose_name='Число подписок'
+    )
+
+    def __str__(self):
+        return f'{self.user}'
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+
+class PostImageVariant(models.Model):
+    """Уменьшенная копия картинки поста для srcset.
+
+    Создаётся вместе с миниатюрами после загрузки картинки
+    (posts.thumbnails), чтобы лента отдавала телефонам файл их ширины.
+    """
+
+    WEBP = 'WEBP'
+    JPEG = 'JPEG'
+    FORMATS = ((WEBP, 'WebP'), (JPEG, 'JPEG'))
+
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='image_variants',
+        verbose_name='Публикация',
+    )
+    image = models.ImageField('Файл', max_length=255)
+    format = models.CharField('Формат', max_length=4, choices=FORMATS)
+    width = models.PositiveIntegerField('Ширина')
+    height = models.PositiveIntegerField('Высота')
+
+    def __str__(self):
+        return f'{self.post_id}: {self.format} {self.width}w'
+
+    class Meta:
+        unique_together = ['post', 'format', 'width']
+        verbose_name = 'Вариант картинки'
+        verbose_name_plural = 'Варианты картинок'
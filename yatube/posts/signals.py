@@ -0,0 +1,205 @@
+from core.counters import adjust_count, feed_count_key, reset_count
+from core.page_cache import bump_page_versions
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete,
+    post_init,
+    post_save,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from .images import EMPTY_METADATA, read_metadata
+from .merge_feed import recent_posts_key
+from .models import (
+    Comment,
+    Follow,
+    Group,
+    Post,
+    PostImageVariant,
+    User,
+    UserStats,
+)
+from .stats import change_group_posts, change_post_comments, change_user_stats
+from .thumbnails import pregenerate
+from .timeline import backfill_timeline, fan_out_post, trim_timeline
+
+
+def post_feed_keys(author_id, group_id):
+    """Ключи счётчиков лент, в которые попадает пост (кроме подписок)."""
+    keys = [feed_count_key('index'), feed_count_key('author', author_id)]
+    if group_id is not None:
+        keys.append(feed_count_key('group', group_id))
+    return keys
+
+
+def follower_ids(author_id):
+    return list(
+        Follow.objects.filter(author_id=author_id).values_list(
+            'user_id', flat=True
+        )
+    )
+
+
+def post_pages(post, *group_ids):
+    """Пространства имён кэша страниц, на которых показан пост."""
+    slugs = Group.objects.filter(pk__in=group_ids).values_list(
+        'slug', flat=True
+    )
+    return [
+        'index',
+        f'profile:{post.author.username}',
+        *(f'group:{slug}' for slug in slugs),
+    ]
+
+
+def bump_post_pages(post, *group_ids):
+    """Сбрасывает кэш страниц, на которых показан пост."""
+    bump_page_versions(*post_pages(post, *group_ids))
+
+
+@receiver(post_init, sender=Post)
+def remember_post_group(sender, instance, **kwargs):
+    # Группа на момент загрузки нужна, чтобы при редактировании
+    # перенести пост между счётчиками групп без лишнего запроса.
+    instance._loaded_group_id = instance.__dict__.get('group_id')
+    instance._loaded_image = instance.__dict__.get('image')
+
+
+def update_post_image(post, created):
+    """Переводит ссылки, варианты и миниатюры на новую картинку поста."""
+    storage = post.image.storage
+    if post.image.name != post._loaded_image and not created:
+        # Варианты прежней картинки не должны попасть в srcset новой.
+        PostImageVariant.objects.filter(post=post).delete()
+        if post._loaded_image:
+            storage.delete(post._loaded_image)
+    elif post._image_uploaded and not created:
+        # Загрузили ту же картинку: хранилище добавило вторую ссылку
+        # на файл, который пост и так держит.
+        storage.delete(post.image.name)
+    if post.image and post.image.name != post._loaded_image:
+        # Файл и строка поста должны быть видны рабочему процессу,
+        # поэтому задача ставится только после фиксации транзакции.
+        name = post.image.name
+        transaction.on_commit(lambda: pregenerate(name))
+    post._loaded_image = post.image.name
+
+
+@receiver(pre_save, sender=Post)
+def remember_image_upload(sender, instance, **kwargs):
+    # После сохранения уже не узнать, загружался ли файл заново.
+    instance._image_uploaded = bool(
+        instance.image and not instance.image._committed
+    )
+    if instance._image_uploaded:
+        # Заголовок уже прочитан формой, повторное чтение дёшево;
+        # заглушку построит пул миниатюр.
+        metadata = dict(EMPTY_METADATA)
+        try:
+            metadata.update(read_metadata(instance.image.file))
+        except OSError:
+            pass
+    elif not instance.image:
+        metadata = EMPTY_METADATA
+    else:
+        return
+    for field, value in metadata.items():
+        setattr(instance, field, value)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        cache.delete(recent_posts_key(instance.author_id))
+        followers = follower_ids(instance.author_id)
+        if settings.FOLLOW_FEED_ENGINE == 'timeline':
+            fan_out_post(instance, followers)
+        keys = post_feed_keys(instance.author_id, instance.group_id)
+        keys += [feed_count_key('follow', user_id) for user_id in followers]
+        for key in keys:
+            adjust_count(key, 1)
+        change_user_stats(instance.author_id, posts_count=1)
+        change_group_posts(instance.group_id, 1)
+    elif instance._loaded_group_id != instance.group_id:
+        if instance._loaded_group_id is not None:
+            adjust_count(
+                feed_count_key('group', instance._loaded_group_id), -1
+            )
+        if instance.group_id is not None:
+            adjust_count(feed_count_key('group', instance.group_id), 1)
+        change_group_posts(instance._loaded_group_id, -1)
+        change_group_posts(instance.group_id, 1)
+    bump_post_pages(instance, instance._loaded_group_id, instance.group_id)
+    instance._loaded_group_id = instance.group_id
+    update_post_image(instance, created)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    cache.delete(recent_posts_key(instance.author_id))
+    keys = post_feed_keys(instance.author_id, instance.group_id)
+    keys += [
+        feed_count_key('follow', user_id)
+        for user_id in follower_ids(instance.author_id)
+    ]
+    for key in keys:
+        adjust_count(key, -1)
+    change_user_stats(instance.author_id, posts_count=-1)
+    change_group_posts(instance.group_id, -1)
+    bump_post_pages(instance, instance.group_id)
+    if instance.image:
+        instance.image.storage.delete(instance.image.name)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        change_post_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    change_post_comments(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        change_user_stats(instance.author_id, followers_count=1)
+        change_user_stats(instance.user_id, following_count=1)
+        if settings.FOLLOW_FEED_ENGINE == 'timeline':
+            backfill_timeline(instance.user_id, instance.author_id)
+    reset_count(feed_count_key('follow', instance.user_id))
+    bump_page_versions(f'followers:{instance.author.username}')
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    change_user_stats(instance.author_id, followers_count=-1)
+    change_user_stats(instance.user_id, following_count=-1)
+    trim_timeline(instance.user_id, instance.author_id)
+    reset_count(feed_count_key('follow', instance.user_id))
+    bump_page_versions(f'followers:{instance.author.username}')
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    # Название и slug группы выводятся во всех лентах.
+    bump_page_versions('meta')
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    # У нового пользователя ещё нет постов, а вход обновляет только
+    # last_login — на ленты это не влияет, и сбрасывать их кэш незачем.
+    if kwargs.get('created'):
+        UserStats.objects.create(user=instance)
+        return
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    bump_page_versions('meta')
@@ -0,0 +1,93 @@
+"""Денормализованные счётчики постов, комментариев и подписок."""
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+BATCH_SIZE = 500
+
+
+def shifted(field, delta):
+    """Значение счётчика после сдвига, не ниже нуля.
+
+    Счётчик мог разойтись с таблицами (bulk_create, пропущенный
+    сигнал), а отрицательное значение нарушило бы CHECK положительного
+    поля — и удаление строки упало бы вместе с ним.
+    """
+    return Greatest(F(field) + delta, 0)
+
+
+def change_user_stats(user_id, **deltas):
+    """Атомарно сдвигает счётчики пользователя: posts_count=1 и т.п.
+
+    Строки нет только у удаляемого пользователя — тогда сдвигать нечего.
+    """
+    UserStats.objects.filter(user_id=user_id).update(
+        **{field: shifted(field, delta) for field, delta in deltas.items()}
+    )
+
+
+def change_group_posts(group_id, delta):
+    if group_id is not None:
+        Group.objects.filter(pk=group_id).update(
+            posts_count=shifted('posts_count', delta)
+        )
+
+
+def change_post_comments(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=shifted('comments_count', delta)
+    )
+
+
+def count_of(model, field, outer='pk'):
+    """Подзапрос с числом строк model, ссылающихся на внешнюю строку."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef(outer)})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        0,
+    )
+
+
+def scoped(queryset, field, ids):
+    """Порции queryset по ids или весь queryset, если ids is None.
+
+    Порции держат число параметров запроса в пределах SQLite.
+    """
+    if ids is None:
+        yield queryset
+        return
+    ids = list(ids)
+    for start in range(0, len(ids), BATCH_SIZE):
+        yield queryset.filter(
+            **{f'{field}__in': ids[start:start + BATCH_SIZE]}
+        )
+
+
+def recount_stats(user_ids=None, group_ids=None, post_ids=None):
+    """Пересчитывает счётчики по данным таблиц.
+
+    Без аргументов пересчитывается всё; иначе только строки с
+    переданными id (пустой набор — ни одной).
+    """
+    missing = User.objects.filter(stats__isnull=True)
+    for users in scoped(missing, 'id', user_ids):
+        UserStats.objects.bulk_create(
+            UserStats(user_id=user_id)
+            for user_id in users.values_list('id', flat=True)
+        )
+    for stats in scoped(UserStats.objects.all(), 'user_id', user_ids):
+        stats.update(
+            posts_count=count_of(Post, 'author', 'user'),
+            followers_count=count_of(Follow, 'author', 'user'),
+            following_count=count_of(Follow, 'user', 'user'),
+        )
+    for groups in scoped(Group.objects.all(), 'pk', group_ids):
+        groups.update(posts_count=count_of(Post, 'group'))
+    for posts in scoped(Post.objects.all(), 'pk', post_ids):
+        posts.update(comments_count=count_of(Comment, 'post'))
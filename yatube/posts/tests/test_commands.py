@@ -0,0 +1,261 @@
+import csv
+import gzip
+import json
+import os
+import random
+import tempfile
+from collections import Counter
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from ..management.commands.bench import Dataset, power_law_edges, url_patterns
+from ..models import Comment, Follow, Group, Post, TimelineEntry, UserStats
+
+User = get_user_model()
+
+
+class ImportContentTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def run_import(self, path, *args):
+        out = StringIO()
+        call_command('import_content', path, *args, stdout=out)
+        return out.getvalue()
+
+    def test_import_jsonl(self):
+        rows = [
+            {
+                'type': 'post',
+                'id': 100,
+                'author': 'author',
+                'group': 'test-slug',
+                'text': 'Импортированный пост',
+                'pub_date': '2020-01-02T03:04:05+00:00',
+            },
+            {'type': 'post', 'author': 'nobody', 'text': 'Без автора'},
+            {
+                'type': 'comment',
+                'post': 100,
+                'author': 'reader',
+                'text': 'Комментарий',
+            },
+            {'type': 'follow', 'user': 'reader', 'author': 'author'},
+            {'type': 'follow', 'user': 'reader', 'author': 'author'},
+        ]
+        path = self.write(
+            'content.jsonl', '\n'.join(json.dumps(row) for row in rows)
+        )
+        output = self.run_import(path, '--batch-size', '2')
+        self.assertIn('пропущено: 1', output)
+        post = Post.objects.get(pk=100)
+        self.assertEqual(post.pub_date.year, 2020)
+        self.assertEqual(post.updated, post.pub_date)
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 1
+        )
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader, post=post).exists()
+        )
+
+    def test_import_csv_creates_users(self):
+        path = self.write(
+            'follows.csv', 'user,author\nnewcomer,author\nreader,author\n'
+        )
+        self.run_import(path, '--type', 'follow', '--create-users')
+        newcomer = User.objects.get(username='newcomer')
+        self.assertFalse(newcomer.has_usable_password())
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).followers_count, 2
+        )
+
+    def test_rows_without_required_fields_are_skipped(self):
+        rows = [
+            {'type': 'post', 'id': 100, 'author': 'author', 'text': 'Пост'},
+            {'type': 'post', 'author': 'author'},
+            {'type': 'comment', 'author': 'reader', 'text': 'Без поста'},
+            {'type': 'comment', 'post': 'abc', 'author': 'reader'},
+            {'type': 'comment', 'post': 100, 'author': 'reader'},
+        ]
+        path = self.write(
+            'content.jsonl', '\n'.join(json.dumps(row) for row in rows)
+        )
+        self.assertIn('пропущено: 4', self.run_import(path))
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertFalse(Comment.objects.exists())
+
+    def test_incremental_import_touches_only_its_authors(self):
+        bystander = User.objects.create_user(username='bystander')
+        UserStats.objects.filter(user=bystander).update(posts_count=7)
+        cache.set('unrelated', 'value')
+        url = reverse('posts:group_list', args=[self.group.slug])
+        self.assertNotContains(self.client.get(url), 'Дозагруженный пост')
+        path = self.write(
+            'content.jsonl',
+            json.dumps(
+                {
+                    'type': 'post',
+                    'author': 'author',
+                    'group': 'test-slug',
+                    'text': 'Дозагруженный пост',
+                }
+            ),
+        )
+        self.run_import(path)
+        self.assertContains(self.client.get(url), 'Дозагруженный пост')
+        self.assertEqual(cache.get('unrelated'), 'value')
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 1
+        )
+        # Счётчики незатронутых пользователей не пересчитываются.
+        self.assertEqual(UserStats.objects.get(user=bystander).posts_count, 7)
+        self.assertEqual(Group.objects.get().posts_count, 1)
+
+    def test_rerun_with_existing_ids(self):
+        rows = [
+            {'type': 'post', 'id': 100, 'author': 'author', 'text': 'Первый'},
+            {'type': 'post', 'id': 101, 'author': 'author', 'text': 'Второй'},
+            {
+                'type': 'comment',
+                'id': 200,
+                'post': 100,
+                'author': 'reader',
+                'text': 'Комментарий',
+            },
+        ]
+        path = self.write(
+            'content.jsonl', '\n'.join(json.dumps(row) for row in rows)
+        )
+        self.run_import(path, '--batch-size', '2')
+        with self.assertRaisesMessage(CommandError, 'Строки 1–2'):
+            self.run_import(path, '--batch-size', '2')
+        self.run_import(path, '--batch-size', '2', '--ignore-existing')
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(Post.objects.get(pk=100).comments_count, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 2
+        )
+
+
+class ExportContentTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.posts = [
+            Post.objects.create(author=self.author, text=f'Пост {number}')
+            for number in range(3)
+        ]
+        Post.objects.filter(pk=self.posts[0].pk).update(
+            pub_date='2000-01-01T00:00:00+00:00'
+        )
+        Comment.objects.create(
+            post=self.posts[1], author=self.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def export(self, name, *args):
+        path = os.path.join(self.directory.name, name)
+        call_command(
+            'export_content', '--output', path, *args, stderr=StringIO()
+        )
+        return path
+
+    def test_export_in_keyset_batches(self):
+        path = self.export('content.jsonl', '--batch-size', '2')
+        with open(path, encoding='utf-8') as file:
+            rows = [json.loads(line) for line in file]
+        self.assertEqual(
+            [row['type'] for row in rows],
+            ['post'] * 3 + ['comment', 'follow'],
+        )
+        self.assertEqual(
+            [row['id'] for row in rows[:3]],
+            [post.pk for post in self.posts],
+        )
+
+    def test_since_and_gzip_csv(self):
+        path = self.export(
+            'posts.csv.gz', '--type', 'post', '--since', '2010-01-01'
+        )
+        with gzip.open(path, 'rt', encoding='utf-8') as file:
+            rows = list(csv.DictReader(file))
+        self.assertEqual(
+            [int(row['id']) for row in rows],
+            [post.pk for post in self.posts[1:]],
+        )
+
+    def test_round_trip_through_import(self):
+        posts = Post.objects.order_by('pk').values_list(
+            'pk', 'text', 'pub_date'
+        )
+        expected = list(posts)
+        path = self.export('content.jsonl')
+        Post.objects.all().delete()
+        Follow.objects.all().delete()
+        call_command('import_content', path, stdout=StringIO())
+        self.assertEqual(list(posts), expected)
+        self.assertEqual(Comment.objects.get().post_id, self.posts[1].pk)
+        self.assertTrue(
+            Follow.objects.filter(user=self.reader, author=self.author)
+        )
+
+
+class BenchDatasetTest(TestCase):
+    def test_dataset_covers_every_url(self):
+        dataset = Dataset(
+            {
+                'seed': 1,
+                'users': 20,
+                'groups': 2,
+                'posts': 50,
+                'comments': 30,
+                'follows': 40,
+                'alpha': 1.2,
+            }
+        )
+        self.assertEqual(Post.objects.count(), 50)
+        self.assertTrue(TimelineEntry.objects.exists())
+        names = []
+        for name, pattern in url_patterns():
+            with self.subTest(name=name):
+                reverse(name, kwargs=dataset.kwargs(pattern))
+            names.append(name)
+        self.assertIn('posts:post_detail', names)
+        self.assertIn('about:tech', names)
+
+    def test_follows_follow_power_law(self):
+        users = list(range(100))
+        edges = power_law_edges(users, 1000, 1.2, random.Random(1))
+        followers = Counter(author for _, author in edges)
+        ranked = [count for _, count in followers.most_common()]
+        self.assertEqual(len(set(edges)), len(edges))
+        self.assertGreater(ranked[0], 10 * ranked[len(ranked) // 2])
@@ -1,18 +1,32 @@
+import io
 import shutil
 import tempfile
 from http import HTTPStatus
 
+from core.uploads import disk_uploads
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
+from posts.forms import PostForm
 from posts.models import Group, Post
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 User = get_user_model()
 
 
+def stored_name(name, content):
+    """Имя, под которым хранилище сохранит загруженный файл."""
+    return Post._meta.get_field('image').storage.content_name(
+        f'posts/{name}', ContentFile(content)
+    )
+
+
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostFormTests(TestCase):
     @classmethod
@@ -140,14 +154,16 @@ class PostFormTests(TestCase):
             text='Тестовый пост 3',
             group=self.group,
             author=self.user,
-            image='posts/small.gif',
+            image=stored_name('small.gif', small_gif),
         )
         self.assertEqual(response.status_code, HTTPStatus.FOUND)
         self.assertNotEqual(posts_count, posts_count + 1)
         self.assertEqual(new_post.text, form_data['text'])
         self.assertEqual(new_post.group.id, form_data['group'])
         self.assertEqual(new_post.author, form_data['author'])
-        self.assertEqual(new_post.image, f'posts/{uploaded.name}')
+        self.assertEqual(
+            new_post.image, stored_name(uploaded.name, small_gif)
+        )
 
     def test_auth_user_can_edit_post_with_image(self):
         post = Post.objects.create(
@@ -181,7 +197,9 @@ class PostFormTests(TestCase):
         self.assertEqual(changed_post.text, form_data['text'])
         self.assertEqual(changed_post.group.id, form_data['group'])
         self.assertEqual(changed_post.author, form_data['author'])
-        self.assertEqual(changed_post.image, f'posts/{uploaded.name}')
+        self.assertEqual(
+            changed_post.image, stored_name(uploaded.name, small_gif)
+        )
 
     def test_auth_user_can_added_comment(self):
         post = Post.objects.create(
@@ -199,3 +217,73 @@ class PostFormTests(TestCase):
         self.assertEqual(changed_post.text, post.text)
         self.assertEqual(changed_post.group, post.group)
         self.assertEqual(changed_post.author, post.author)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageUploadTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def make_image(self, name, size, image_format):
+        buffer = io.BytesIO()
+        Image.new('RGB', size, 'teal').save(buffer, image_format)
+        return SimpleUploadedFile(name, buffer.getvalue())
+
+    def make_form(self, image):
+        return PostForm(data={'text': 'Пост'}, files={'image': image})
+
+    def assertImageError(self, form, code):
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors.as_data()['image'][0].code, code)
+
+    def test_uploads_are_streamed_to_disk(self):
+        handlers = []
+
+        @disk_uploads
+        def view(request):
+            handlers.extend(request.upload_handlers)
+            return HttpResponse()
+
+        view(RequestFactory().get('/'))
+        self.assertEqual(len(handlers), 1)
+        self.assertIsInstance(handlers[0], TemporaryFileUploadHandler)
+
+    @override_settings(IMAGE_MAX_EDGE=400)
+    def test_large_image_is_downsized(self):
+        user = User.objects.create_user(username='auth')
+        client = Client()
+        client.force_login(user)
+        client.post(
+            reverse('posts:post_create'),
+            {
+                'text': 'Широкая картинка',
+                'image': self.make_image('wide.jpg', (1000, 300), 'JPEG'),
+            },
+        )
+        post = Post.objects.get(author=user)
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (400, 120))
+            self.assertEqual(image.format, 'JPEG')
+
+    @override_settings(IMAGE_MAX_EDGE=400)
+    def test_small_image_is_kept(self):
+        uploaded = self.make_image('small.png', (300, 200), 'PNG')
+        form = self.make_form(uploaded)
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertIs(form.cleaned_data['image'], uploaded)
+
+    @override_settings(IMAGE_UPLOAD_MAX_PIXELS=10_000)
+    def test_too_many_pixels_rejected(self):
+        form = self.make_form(self.make_image('bomb.png', (200, 100), 'PNG'))
+        self.assertImageError(form, 'too_many_pixels')
+
+    def test_unsupported_format_rejected(self):
+        form = self.make_form(self.make_image('image.bmp', (10, 10), 'BMP'))
+        self.assertImageError(form, 'invalid_format')
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIZE=100)
+    def test_large_file_rejected(self):
+        form = self.make_form(self.make_image('big.png', (200, 200), 'PNG'))
+        self.assertImageError(form, 'file_too_large')
@@ -1,8 +1,11 @@
+from io import StringIO
+
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
 
-from ..models import Comment, Follow, Group, Post
+from ..models import Comment, Follow, Group, Post, UserStats
 
 User = get_user_model()
 
@@ -134,3 +137,92 @@ class FollowModelTest(TestCase):
                 self.assertEqual(
                     Follow._meta.get_field(field).verbose_name, expected_value
                 )
+
+
+class CountersTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(
+            title='Группа', slug='counters', description='Описание'
+        )
+        self.post = Post.objects.create(
+            author=self.author, text='Пост', group=self.group
+        )
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_post_counters(self):
+        Post.objects.create(author=self.author, text='Ещё пост')
+        self.assertEqual(self.stats(self.author).posts_count, 2)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        self.post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+
+    def test_group_change_moves_post(self):
+        other = Group.objects.create(
+            title='Другая', slug='other', description='Описание'
+        )
+        post = Post.objects.get(pk=self.post.pk)
+        post.group = other
+        post.save()
+        self.group.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(other.posts_count, 1)
+
+    def test_comment_counter(self):
+        comment = Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        comment.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+
+    def test_follow_counters(self):
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        follow.delete()
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_delete_with_drifted_counters(self):
+        comment = Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        UserStats.objects.update(
+            posts_count=0, followers_count=0, following_count=0
+        )
+        Group.objects.update(posts_count=0)
+        Post.objects.update(comments_count=0)
+        comment.delete()
+        follow.delete()
+        self.post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+
+    def test_recount_repairs_drift(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        UserStats.objects.update(
+            posts_count=7, followers_count=7, following_count=7
+        )
+        Group.objects.update(posts_count=7)
+        UserStats.objects.filter(user=self.reader).delete()
+        call_command('recount', stdout=StringIO())
+        author_stats = self.stats(self.author)
+        self.assertEqual(author_stats.posts_count, 1)
+        self.assertEqual(author_stats.followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
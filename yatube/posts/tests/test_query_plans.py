@@ -0,0 +1,106 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Сортировка во временном B-дереве означает, что запрос читает все
+# подходящие строки и сортирует их, вместо диапазона по индексу.
+TEMP_SORT = 'USE TEMP B-TREE'
+# Полный просмотр таблицы без индекса: «SCAN posts_post» в SQLite 3.36+
+# и «SCAN TABLE posts_post» в более ранних версиях.
+FULL_SCAN = re.compile(r'\bSCAN (?:TABLE )?(\w+)$')
+
+
+class QueryRecorder:
+    """Запоминает SELECT-запросы вместе с параметрами."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith('SELECT'):
+            self.queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+
+class QueryPlanTest(TestCase):
+    """Запросы страниц лент не сортируют и не просматривают таблицы."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for number in range(15):
+            post = Post.objects.create(
+                author=cls.author, text=f'Пост {number}', group=cls.group
+            )
+        cls.post = post
+        Comment.objects.create(post=post, author=cls.reader, text='Текст')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def plans(self, url, data=None):
+        # Из закэшированного фрагмента {% cache %} страница берётся без
+        # запроса постов, и проверять было бы нечего.
+        cache.clear()
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            self.client.get(url, data)
+        with connection.cursor() as cursor:
+            for sql, params in recorder.queries:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                yield sql, [row[-1] for row in cursor.fetchall()]
+
+    def assert_indexed(self, url, data=None):
+        plans = list(self.plans(url, data))
+        self.assertTrue(
+            any('"posts_post"' in sql for sql, _ in plans),
+            f'{url} {data}: посты не запрашивались',
+        )
+        for sql, plan in plans:
+            with self.subTest(url=url, data=data, sql=sql):
+                for step in plan:
+                    self.assertNotIn(TEMP_SORT, step, plan)
+                    self.assertIsNone(FULL_SCAN.search(step), plan)
+
+    def urls(self):
+        return (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:post_detail', args=[self.post.id]),
+            reverse('posts:follow_index'),
+        )
+
+    def test_page_mode_uses_indexes(self):
+        for url in self.urls():
+            self.assert_indexed(url, {'page': 2})
+
+    def test_cursor_mode_uses_indexes(self):
+        for url in self.urls():
+            context = self.client.get(url, {'cursor': ''}).context
+            page = context.get('comments') or context['page_obj']
+            self.assert_indexed(url, {'cursor': ''})
+            if page.next_cursor:
+                self.assert_indexed(url, {'cursor': page.next_cursor})
+
+    @override_settings(FOLLOW_FEED_ENGINE='merge')
+    def test_merge_engine_uses_indexes(self):
+        self.assert_indexed(reverse('posts:follow_index'))
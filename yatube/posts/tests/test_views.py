@@ -1,15 +1,40 @@
+import io
 import shutil
 import tempfile
+import time
 from http import HTTPStatus
+from unittest import mock
 
+from core.counters import feed_count_key
+from core.page_cache import (
+    bump_page_versions,
+    page_version_key,
+    page_versions,
+)
+from core.thumbnails import TimedThumbnailBackend
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
-from posts.models import Group, Post
+from PIL import Image
+from posts.models import (
+    Comment,
+    Follow,
+    Group,
+    Post,
+    PostImageVariant,
+    TimelineEntry,
+)
+from posts.images import EMPTY_METADATA
+from posts.thumbnails import pregenerate, task_result, thumbnail_task
+from sorl.thumbnail import get_thumbnail
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 User = get_user_model()
@@ -43,6 +68,9 @@ class PostURLTests(TestCase):
             group=cls.group,
             image=cls.uploaded,
         )
+        cls.image_name = Post._meta.get_field('image').storage.content_name(
+            'posts/small.gif', ContentFile(cls.small_gif)
+        )
 
     @classmethod
     def tearDownClass(cls):
@@ -184,7 +212,7 @@ class PostURLTests(TestCase):
         response = self.authorized_client.get(reverse('posts:index'))
         self.assertIn('page_obj', response.context)
         first_object = response.context['page_obj'][0]
-        self.assertEqual(first_object.image, 'posts/small.gif')
+        self.assertEqual(first_object.image, self.image_name)
 
     def test_group_list_page_context_with_image(self):
         response_first = self.authorized_client.get(
@@ -192,7 +220,7 @@ class PostURLTests(TestCase):
         )
         self.assertIn('page_obj', response_first.context)
         first_object = response_first.context['page_obj'][0]
-        self.assertEqual(first_object.image, 'posts/small.gif')
+        self.assertEqual(first_object.image, self.image_name)
 
     def test_profile_page_context_with_image(self):
         response = self.authorized_client.get(
@@ -200,7 +228,7 @@ class PostURLTests(TestCase):
         )
         self.assertIn('page_obj', response.context)
         first_object = response.context['page_obj'][0]
-        self.assertEqual(first_object.image, 'posts/small.gif')
+        self.assertEqual(first_object.image, self.image_name)
 
     def test_post_detail_context_with_image(self):
         response = self.authorized_client.get(
@@ -208,7 +236,7 @@ class PostURLTests(TestCase):
         )
         self.assertIn('post', response.context)
         post_object = response.context['post']
-        self.assertEqual(post_object.image, 'posts/small.gif')
+        self.assertEqual(post_object.image, self.image_name)
 
     def test_subsribe_auth(self):
         user_following = User.objects.create_user(username='auth2')
@@ -341,6 +369,181 @@ class PaginatorViewsTest(TestCase):
                     expected_values,
                 )
 
+    def test_cursor_pagination(self):
+        url = reverse('posts:group_list', args=[self.group.slug])
+        first_page = self.guest_client.get(url, {'cursor': ''}).context[
+            'page_obj'
+        ]
+        self.assertEqual(len(first_page), settings.LIMIT_POSTS)
+        self.assertFalse(first_page.has_previous())
+        second_page = self.guest_client.get(
+            url, {'cursor': first_page.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(len(second_page), 3)
+        self.assertFalse(second_page.has_next())
+        back_page = self.guest_client.get(
+            url, {'cursor': second_page.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(back_page), list(first_page))
+        self.assertFalse(back_page.has_previous())
+
+    def test_cursor_pagination_ignores_broken_cursor(self):
+        response = self.guest_client.get(
+            reverse('posts:index'), {'cursor': 'broken'}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(
+            len(response.context['page_obj']), settings.LIMIT_POSTS
+        )
+
+
+class FeedCountTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.group_second = Group.objects.create(
+            title='Тестовая группа два',
+            slug='test-slug-two',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, text='Тестовый пост', group=cls.group
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def test_feed_counts_are_cached(self):
+        feeds = (
+            (reverse('posts:index'), feed_count_key('index')),
+            (
+                reverse('posts:group_list', args=[self.group.slug]),
+                feed_count_key('group', self.group.pk),
+            ),
+            (
+                reverse('posts:profile', args=[self.user]),
+                feed_count_key('author', self.user.pk),
+            ),
+        )
+        for url, key in feeds:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(
+                    response.context['page_obj'].paginator.count, 1
+                )
+                self.assertEqual(cache.get(key), 1)
+
+    def test_signals_adjust_cached_counts(self):
+        index_key = feed_count_key('index')
+        group_key = feed_count_key('group', self.group.pk)
+        group_second_key = feed_count_key('group', self.group_second.pk)
+        cache.set_many({index_key: 1, group_key: 1, group_second_key: 0})
+        post = Post.objects.create(
+            author=self.user, text='Новый пост', group=self.group
+        )
+        self.assertEqual(cache.get(index_key), 2)
+        self.assertEqual(cache.get(group_key), 2)
+        post.group = self.group_second
+        post.save()
+        self.assertEqual(cache.get(group_key), 1)
+        self.assertEqual(cache.get(group_second_key), 1)
+        post.delete()
+        self.assertEqual(cache.get(index_key), 1)
+        self.assertEqual(cache.get(group_second_key), 0)
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.author, text='Первый пост')
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        cache.clear()
+
+    def test_timeline_follows_subscriptions(self):
+        self.reader_client.post(
+            reverse('posts:profile_follow', args=[self.author])
+        )
+        self.assertTrue(
+            TimelineEntry.objects.filter(
+                user=self.reader, post=self.post
+            ).exists()
+        )
+        new_post = Post.objects.create(author=self.author, text='Второй пост')
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), [new_post, self.post]
+        )
+        self.reader_client.post(
+            reverse('posts:profile_unfollow', args=[self.author])
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader).exists()
+        )
+
+
+@override_settings(FOLLOW_FEED_ENGINE='merge')
+class MergedFeedTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.authors = [
+            User.objects.create_user(username=f'author{i}') for i in range(3)
+        ]
+        for i in range(8):
+            for author in cls.authors:
+                Post.objects.create(author=author, text=f'Пост {i}')
+        for author in cls.authors[:2]:
+            Follow.objects.create(user=cls.reader, author=author)
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        cache.clear()
+
+    def walk_feed(self):
+        pages = []
+        cursor = ''
+        while cursor is not None:
+            page = self.reader_client.get(
+                reverse('posts:follow_index'), {'cursor': cursor}
+            ).context['page_obj']
+            pages.append(list(page))
+            cursor = page.next_cursor
+        return pages
+
+    def test_merged_feed_matches_join_query(self):
+        expected = list(
+            Post.objects.filter(author__following__user=self.reader)
+        )
+        for depth in (100, 3):
+            with self.subTest(depth=depth):
+                with self.settings(FOLLOW_FEED_DEPTH=depth):
+                    cache.clear()
+                    pages = self.walk_feed()
+                self.assertEqual(
+                    [len(page) for page in pages], [settings.LIMIT_POSTS, 6]
+                )
+                self.assertEqual(sum(pages, []), expected)
+
+    def test_new_post_invalidates_author_list(self):
+        self.walk_feed()
+        post = Post.objects.create(author=self.authors[0], text='Свежий')
+        self.assertEqual(self.walk_feed()[0][0], post)
+
 
 class PostCacheTest(TestCase):
     @classmethod
@@ -367,13 +570,419 @@ class PostCacheTest(TestCase):
             text='Тестовый пост для проверки кэша',
             group=self.group,
         )
-        response_first = self.authorized_client.get(reverse('posts:index'))
-        first_object = response_first.content
-        Post.objects.get(id=post.id).delete()
-        self.assertFalse(Post.objects.filter(id=post.id).exists())
-        response_second = self.authorized_client.get(reverse('posts:index'))
-        second_object = response_second.content
-        self.assertEqual(first_object, second_object)
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.user]),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                first_content = self.authorized_client.get(url).content
+                # update() не шлёт сигналов, поэтому страница остаётся
+                # в кэше.
+                Post.objects.filter(id=post.id).update(text='Скрытая правка')
+                second_content = self.authorized_client.get(url).content
+                self.assertEqual(first_content, second_content)
+                cache.clear()
+                Post.objects.filter(id=post.id).update(text=post.text)
+
+    def test_feed_body_is_shared_between_users(self):
+        guest_client = Client()
+        post = Post.objects.create(
+            author=self.user,
+            text='Тестовый пост для проверки кэша',
+            group=self.group,
+        )
+        guest_client.get(reverse('posts:index'))
+        Post.objects.filter(id=post.id).update(text='Скрытая правка')
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, post.text)
+        self.assertContains(response, f'Пользователь: {self.user.username}')
+        response = guest_client.get(reverse('posts:index'))
+        self.assertContains(response, post.text)
+        self.assertNotContains(response, 'Пользователь:')
+
+    def test_the_cache_is_invalidated_by_signals(self):
+        post = Post.objects.create(
+            author=self.user,
+            text='Тестовый пост для проверки кэша',
+            group=self.group,
+        )
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.user]),
+        )
+        for url in urls:
+            self.assertContains(self.authorized_client.get(url), post.text)
+        post.delete()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertNotContains(
+                    self.authorized_client.get(url), post.text
+                )
+
+    def test_versions_expire_with_process_local_cache(self):
+        # Повышение версии в LocMemCache видит только один воркер,
+        # поэтому остальные должны забыть свою версию по таймауту.
+        self.assertTrue(settings.LOCAL_CACHE)
+        self.assertEqual(settings.PAGE_VERSION_TIMEOUT, 20)
+        (version,) = page_versions('index')
+        later = time.time() + settings.PAGE_VERSION_TIMEOUT + 1
+        with mock.patch('time.time', return_value=later):
+            self.assertNotEqual(page_versions('index'), [version])
+
+    def test_groups_with_equal_versions_do_not_share_feed(self):
+        other_group = Group.objects.create(
+            title='Другая группа', slug='other-slug', description='Описание'
+        )
+        Post.objects.create(
+            author=self.user, text='Пост другой группы', group=other_group
+        )
+        # Версии двух групп отличаются на единицу и совпадут после
+        # повышения версии первой.
+        cache.set_many(
+            {
+                page_version_key(f'group:{self.group.slug}'): 1000,
+                page_version_key(f'group:{other_group.slug}'): 1001,
+            },
+            None,
+        )
+        self.client.get(reverse('posts:group_list', args=[other_group.slug]))
+        bump_page_versions(f'group:{self.group.slug}')
+        response = self.client.get(
+            reverse('posts:group_list', args=[self.group.slug])
+        )
+        self.assertContains(response, self.post.text)
+        self.assertNotContains(response, 'Пост другой группы')
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, text='Тестовый пост', group=cls.group
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        cache.clear()
+
+    def test_unchanged_pages_answer_not_modified(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.user]),
+            reverse('posts:post_detail', args=[self.post.id]),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                etag = self.guest_client.get(url)['ETag']
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+                response = self.authorized_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_feed_etag_changes_with_new_post(self):
+        url = reverse('posts:index')
+        etag = self.guest_client.get(url)['ETag']
+        Post.objects.create(author=self.user, text='Новый пост')
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_post_detail_etag_changes_with_comments(self):
+        url = reverse('posts:post_detail', args=[self.post.id])
+        response = self.guest_client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        etag = response['ETag']
+        self.authorized_client.post(
+            reverse('posts:add_comment', args=[self.post.id]),
+            data={'text': 'Комментарий'},
+        )
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        etag = response['ETag']
+        # Удаление последнего комментария не вернёт старую дату, но
+        # ETag всё равно меняется.
+        self.post.comments.get().delete()
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_post_detail_etag_changes_with_author_and_group(self):
+        url = reverse('posts:post_detail', args=[self.post.id])
+        for changed in (self.user, self.group):
+            with self.subTest(changed=changed):
+                etag = self.guest_client.get(url)['ETag']
+                changed.save()
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
+
+class PostDetailQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, text='Тестовый пост', group=cls.group
+        )
+        for number in range(5):
+            commenter = User.objects.create_user(username=f'reader{number}')
+            Comment.objects.create(
+                post=cls.post, author=commenter, text=f'Комментарий {number}'
+            )
+
+    def setUp(self):
         cache.clear()
-        response_third = self.authorized_client.get(reverse('posts:index'))
-        self.assertNotEqual(second_object, response_third)
+
+    def test_post_detail_fits_query_budget(self):
+        url = reverse('posts:post_detail', args=[self.post.id])
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertContains(response, 'reader4')
+        self.assertEqual(response.context['post'].author.stats.posts_count, 1)
+
+    def test_image_post_fits_query_budget(self):
+        post = Post.objects.create(
+            author=self.user, text='Пост с картинкой', image='posts/photo.jpg'
+        )
+        PostImageVariant.objects.bulk_create(
+            PostImageVariant(
+                post=post,
+                image=f'cache/{image_format}/{width}.jpg',
+                format=image_format,
+                width=width,
+                height=width // 2,
+            )
+            for image_format in (PostImageVariant.WEBP, PostImageVariant.JPEG)
+            for width in (480, 960)
+        )
+        url = reverse('posts:post_detail', args=[post.id])
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertContains(response, 'cache/JPEG/960.jpg 960w')
+        self.assertContains(response, 'cache/WEBP/480.jpg 480w')
+        self.assertEqual(len(response.context['post'].image_variant_list), 4)
+
+    def test_missing_post_is_not_found(self):
+        response = self.client.get(reverse('posts:post_detail', args=[0]))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+@override_settings(LIMIT_COMMENTS=3)
+class CommentPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.user, text=f'Комментарий {i}')
+            for i in range(7)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_comments_are_loaded_by_cursor(self):
+        url = reverse('posts:post_detail', args=[self.post.id])
+        seen = []
+        cursor = ''
+        while cursor is not None:
+            with self.assertNumQueries(2):
+                response = self.client.get(url, {'cursor': cursor})
+            comments = response.context['comments']
+            self.assertLessEqual(len(comments), 3)
+            seen.extend(comment.pk for comment in comments)
+            cursor = comments.next_cursor
+        expected = self.post.comments.order_by('-created', '-pk')
+        self.assertEqual(seen, list(expected.values_list('pk', flat=True)))
+
+    def test_etag_depends_on_cursor(self):
+        url = reverse('posts:post_detail', args=[self.post.id])
+        first = self.client.get(url)
+        response = self.client.get(
+            url,
+            {'cursor': first.context['comments'].next_cursor},
+            HTTP_IF_NONE_MATCH=first['ETag'],
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailPregenerationTest(TestCase):
+    small_gif = (
+        b'\x47\x49\x46\x38\x39\x61\x02\x00'
+        b'\x01\x00\x80\x00\x00\x00\x00\x00'
+        b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+        b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+        b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+        b'\x0A\x00\x3B'
+    )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        # Записи sorl о миниатюрах живут и в кэше, а одинаковые картинки
+        # разных тестов получают одно имя по содержимому.
+        cache.clear()
+        self.user = User.objects.create_user(username='auth')
+
+    def create_post(self, name):
+        return Post.objects.create(
+            author=self.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(name, self.small_gif, 'image/gif'),
+        )
+
+    def test_thumbnail_scheduled_after_commit(self):
+        callbacks = len(connection.run_on_commit)
+        post = self.create_post('scheduled.gif')
+        self.assertEqual(len(connection.run_on_commit), callbacks + 1)
+        post.text = 'Новый текст'
+        post.save()
+        self.assertEqual(len(connection.run_on_commit), callbacks + 1)
+
+    def test_pregenerate_builds_thumbnail(self):
+        post = self.create_post('warm.gif')
+        pregenerate(post.image.name)
+        with mock.patch.object(
+            TimedThumbnailBackend, '_create_thumbnail'
+        ) as create:
+            thumbnail = get_thumbnail(
+                post.image, '960x339', crop='center', upscale=True
+            )
+        create.assert_not_called()
+        self.assertTrue(default_storage.exists(thumbnail.name))
+
+    def create_photo_post(self, name):
+        buffer = io.BytesIO()
+        Image.new('RGB', (1200, 600), 'teal').save(buffer, 'PNG')
+        return Post.objects.create(
+            author=self.user,
+            text='Пост с фотографией',
+            image=SimpleUploadedFile(name, buffer.getvalue(), 'image/png'),
+        )
+
+    @override_settings(IMAGE_VARIANT_WIDTHS=(480, 960, 1440))
+    def test_pregenerate_stores_width_variants(self):
+        post = self.create_photo_post('photo.png')
+        pregenerate(post.image.name)
+        variants = post.image_variants.values_list('format', 'width', 'height')
+        # 1440 шире оригинала: без растягивания он совпал бы с 1200.
+        self.assertEqual(
+            sorted(variants),
+            [
+                ('JPEG', 480, 170),
+                ('JPEG', 960, 339),
+                ('JPEG', 1200, 509),
+                ('WEBP', 480, 170),
+                ('WEBP', 960, 339),
+                ('WEBP', 1200, 509),
+            ],
+        )
+        for variant in post.image_variants.all():
+            self.assertTrue(default_storage.exists(variant.image.name))
+
+    def test_pool_task_leaves_page_reset_to_parent(self):
+        post = self.create_photo_post('pool.png')
+        namespace = f'profile:{self.user.username}'
+        (version,) = page_versions(namespace)
+        result = thumbnail_task(post.image.name)
+        # Кэш рабочего процесса не виден страницам: сброс делает
+        # родитель, получив результат.
+        self.assertEqual(page_versions(namespace), [version])
+        self.assertIsNone(task_result(result))
+        self.assertEqual(page_versions(namespace), [version + 1])
+        updated = Post.objects.get(pk=post.pk).updated
+        self.assertGreater(updated, post.updated)
+
+    def test_feed_renders_srcset(self):
+        post = self.create_photo_post('feed.png')
+        pregenerate(post.image.name)
+        cache.clear()
+        response = self.client.get(reverse('posts:index'))
+        fallback = response.context['page_obj'][0].image_fallback
+        self.assertEqual(fallback.format, PostImageVariant.JPEG)
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(
+            response, f'{fallback.image.url} {fallback.width}w'
+        )
+        self.assertContains(response, f'width="{fallback.width}"')
+        self.assertContains(response, 'loading="lazy"')
+
+    def test_new_image_drops_old_variants(self):
+        post = self.create_photo_post('old.png')
+        pregenerate(post.image.name)
+        post.image = SimpleUploadedFile('new.gif', self.small_gif, 'image/gif')
+        post.save()
+        self.assertFalse(post.image_variants.exists())
+
+    def test_upload_records_image_metadata(self):
+        post = self.create_photo_post('meta.png')
+        post.refresh_from_db()
+        self.assertEqual(
+            (post.image_width, post.image_height, post.image_format),
+            (1200, 600, 'PNG'),
+        )
+        self.assertEqual(post.image_size, post.image.size)
+        pregenerate(post.image.name)
+        post.refresh_from_db()
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/jpeg;base64,')
+        )
+        cache.clear()
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, post.image_placeholder)
+
+    def test_post_without_variants_uses_stored_size(self):
+        post = self.create_photo_post('pending.png')
+        with mock.patch(
+            'sorl.thumbnail.templatetags.thumbnail.default.backend'
+        ) as backend:
+            response = self.client.get(reverse('posts:index'))
+        backend.get_thumbnail.assert_not_called()
+        self.assertContains(response, f'src="{post.image.url}"')
+        self.assertContains(response, 'width="1200" height="600"')
+
+    def test_backfill_fills_missing_metadata(self):
+        post = self.create_photo_post('legacy.png')
+        Post.objects.filter(pk=post.pk).update(**EMPTY_METADATA)
+        call_command(
+            'backfill_image_metadata', workers=0, stdout=io.StringIO()
+        )
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (1200, 600))
+        self.assertNotEqual(post.image_placeholder, '')
+
+    def test_removed_image_clears_metadata(self):
+        post = self.create_photo_post('removed.png')
+        post.image = None
+        post.save()
+        post.refresh_from_db()
+        self.assertIsNone(post.image_width)
+        self.assertEqual(post.image_format, '')
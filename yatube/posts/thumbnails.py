@@ -0,0 +1,205 @@
+"""Заблаговременная генерация миниатюр постов.
+
+Без неё миниатюру делает первый зритель поста прямо во время рендеринга
+ленты. Здесь миниатюры строятся после сохранения поста в пуле процессов:
+декодирование и кадрирование Pillow упираются в процессор, и потоки под
+GIL не дали бы параллельности.
+"""
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from core import metrics
+from core.page_cache import bump_page_versions
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Должны совпадать с {% thumbnail %} в includes/insert-picture.html.
+VARIANTS = (('960x339', {'crop': 'center', 'upscale': True}),)
+
+# Пропорции кадра ленты; ширины берутся из IMAGE_VARIANT_WIDTHS.
+VARIANT_RATIO = 339 / 960
+VARIANT_FORMATS = ('WEBP', 'JPEG')
+
+# Настройки, которые рабочий процесс берёт у родителя, а не из модуля
+# настроек: они могут быть переопределены при запуске.
+SHARED_SETTINGS = ('DATABASES', 'MEDIA_ROOT')
+
+_executor = None
+
+
+def init_worker(overrides):
+    # Процессы запускаются методом spawn и не наследуют ни настроенный
+    # Django, ни соединения с базой родителя.
+    import django
+
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+    django.setup()
+
+
+def make_executor(workers):
+    overrides = {name: getattr(settings, name) for name in SHARED_SETTINGS}
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=get_context('spawn'),
+        initializer=init_worker,
+        initargs=(overrides,),
+    )
+
+
+def can_use_pool():
+    # Базу SQLite в памяти другой процесс не увидит.
+    return settings.THUMBNAIL_WORKERS and not (
+        connection.vendor == 'sqlite' and connection.is_in_memory_db()
+    )
+
+
+def variant_geometry(width):
+    return f'{width}x{round(width * VARIANT_RATIO)}'
+
+
+def source_image(name):
+    """Исходник в хранилище поля Post.image.
+
+    Ключи миниатюр sorl учитывают хранилище, поэтому голое имя
+    (default_storage) дало бы миниатюры, которых шаблоны не найдут.
+    """
+    from sorl.thumbnail.images import ImageFile
+
+    from .models import Post
+
+    return ImageFile(name, Post._meta.get_field('image').storage)
+
+
+def generate_variants(name):
+    """Строит варианты картинки для srcset и записывает их у постов.
+
+    Вместе с ними постам записываются метаданные и заглушка картинки.
+    Возвращает пространства имён кэша страниц с этими постами: сбросить
+    их должен процесс, чей кэш видят страницы (см. task_done).
+
+    Картинки меньше кадра не растягиваются, поэтому у мелкого оригинала
+    несколько ширин дают один и тот же файл — такие повторы
+    отбрасываются.
+    """
+    from sorl.thumbnail import get_thumbnail
+
+    from .images import file_metadata
+    from .models import Post, PostImageVariant
+    from .signals import post_pages
+
+    thumbnails = {}
+    for width in settings.IMAGE_VARIANT_WIDTHS:
+        for image_format in VARIANT_FORMATS:
+            thumbnail = get_thumbnail(
+                source_image(name),
+                variant_geometry(width),
+                crop='center',
+                upscale=False,
+                format=image_format,
+            )
+            thumbnails.setdefault((image_format, thumbnail.width), thumbnail)
+    metadata = file_metadata(name)
+    posts = list(Post.objects.filter(image=name).select_related('author'))
+    with transaction.atomic():
+        # Новая дата меняет ETag страницы поста.
+        Post.objects.filter(pk__in=[post.pk for post in posts]).update(
+            updated=timezone.now(), **metadata
+        )
+        PostImageVariant.objects.filter(post__in=posts).delete()
+        PostImageVariant.objects.bulk_create(
+            PostImageVariant(
+                post=post,
+                image=thumbnail.name,
+                format=image_format,
+                width=thumbnail.width,
+                height=thumbnail.height,
+            )
+            for post in posts
+            for (image_format, _), thumbnail in thumbnails.items()
+        )
+    return list(
+        dict.fromkeys(
+            namespace
+            for post in posts
+            for namespace in post_pages(post, post.group_id)
+        )
+    )
+
+
+def build_thumbnails(name, force=False):
+    """Строит миниатюры; возвращает (текст ошибки или None, страницы).
+
+    Выполняется и в рабочих процессах, поэтому не бросает исключений
+    наружу: сбой одной картинки не должен останавливать остальные.
+    """
+    from sorl.thumbnail import delete, get_thumbnail
+
+    try:
+        if force:
+            delete(source_image(name), delete_file=False)
+        for geometry, options in VARIANTS:
+            get_thumbnail(source_image(name), geometry, **options)
+        pages = generate_variants(name)
+    except Exception as error:
+        return f'{name}: {error}', []
+    return None, pages
+
+
+def generate_thumbnails(name, force=False):
+    """Строит все VARIANTS и варианты для srcset картинки в этом процессе.
+
+    Возвращает текст ошибки или None.
+    """
+    error, pages = build_thumbnails(name, force)
+    bump_page_versions(*pages)
+    return error
+
+
+def thumbnail_task(name, force=False):
+    """Задача пула: build_thumbnails и метрики рабочего процесса.
+
+    У рабочего процесса свой кэш, а его /metrics никто не читает,
+    поэтому страницы для сброса и время генерации миниатюр уходят
+    родителю вместе с результатом.
+    """
+    error, pages = build_thumbnails(name, force)
+    return error, pages, metrics.take()
+
+
+def task_result(result):
+    """Применяет результат thumbnail_task в родителе; возвращает ошибку."""
+    error, pages, recorded = result
+    metrics.absorb(recorded)
+    bump_page_versions(*pages)
+    return error
+
+
+def task_done(future):
+    if future.exception():
+        logger.warning('Миниатюра не создана: %s', future.exception())
+        return
+    error = task_result(future.result())
+    if error:
+        logger.warning('Миниатюра не создана: %s', error)
+
+
+def pregenerate(name):
+    """Ставит картинку в очередь пула или строит миниатюры сразу.
+
+    При THUMBNAIL_WORKERS = 0 или базе в памяти пул не создаётся и
+    миниатюры строятся в текущем процессе.
+    """
+    global _executor
+    if not can_use_pool():
+        error = generate_thumbnails(name)
+        if error:
+            logger.warning('Миниатюра не создана: %s', error)
+        return
+    if _executor is None:
+        _executor = make_executor(settings.THUMBNAIL_WORKERS)
+    _executor.submit(thumbnail_task, name).add_done_callback(task_done)
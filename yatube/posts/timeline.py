@@ -0,0 +1,114 @@
+"""Материализованная лента подписок (fan-out on write).
+
+Каждый пост автора раскладывается по строкам TimelineEntry его
+подписчиков, поэтому чтение /follow/ — это диапазонный просмотр индекса
+(user, -pub_date) по строкам одного читателя без join через Follow.
+"""
+from itertools import islice
+
+from django.db.models import F
+
+from .models import Follow, Post, TimelineEntry
+from .stats import scoped
+
+BATCH_SIZE = 500
+
+
+def fan_out_post(post, follower_ids):
+    """Кладёт новый пост в ленты всех подписчиков автора."""
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                user_id=user_id,
+                post_id=post.pk,
+                author_id=post.author_id,
+                pub_date=post.pub_date,
+            )
+            for user_id in follower_ids
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill_timeline(user_id, author_id):
+    """Заполняет ленту читателя постами автора после подписки."""
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        'id', 'pub_date'
+    )
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                user_id=user_id,
+                post_id=post_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+            for post_id, pub_date in posts.iterator()
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def rebuild_timeline(author_ids=None, user_ids=None):
+    """Достраивает ленты читателей по их подпискам.
+
+    Пары подписка-пост читаются потоковым join-запросом; уже
+    существующие строки пропускаются, поэтому вызов идемпотентен.
+    Нужен после массовой загрузки, которая идёт в обход сигналов.
+    С аргументами достраиваются только подписки на author_ids и
+    подписки читателей user_ids.
+    """
+    follows = Follow.objects.filter(author__posts__isnull=False)
+    if author_ids is None and user_ids is None:
+        parts = [follows]
+    else:
+        # Пересечения частей отбрасывает ignore_conflicts.
+        parts = [
+            *scoped(follows, 'author_id', author_ids or ()),
+            *scoped(follows, 'user_id', user_ids or ()),
+        ]
+    entries = (
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post_id,
+            author_id=author_id,
+            pub_date=pub_date,
+        )
+        for part in parts
+        for user_id, author_id, post_id, pub_date in part.values_list(
+            'user_id',
+            'author_id',
+            'author__posts__id',
+            'author__posts__pub_date',
+        ).iterator()
+    )
+    # bulk_create превращает генератор в список целиком, поэтому
+    # порции отдаются ему по очереди.
+    while True:
+        batch = list(islice(entries, BATCH_SIZE))
+        if not batch:
+            break
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def trim_timeline(user_id, author_id):
+    """Убирает из ленты читателя посты автора после отписки."""
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def timeline_posts(user):
+    """Посты ленты подписок в порядке материализованной ленты.
+
+    Ключ сортировки берётся из столбцов самой ленты, чтобы запрос шёл
+    по индексу (user, -pub_date, -post) без досортировки.
+    """
+    return (
+        Post.objects.filter(timeline_entries__user=user)
+        .annotate(
+            feed_date=F('timeline_entries__pub_date'),
+            feed_post_id=F('timeline_entries__post_id'),
+        )
+        .order_by('-feed_date', '-feed_post_id')
+    )
@@ -1,36 +1,80 @@
+from core.counters import feed_count_key
+from core.page_cache import feed_cache_context
+from core.paginators import CursorPaginator
+from core.routers import read_only
+from core.uploads import disk_uploads
 from core.utils import paginate_page
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
+from django.views.decorators.http import condition
 
+from .conditional import feed_etag, post_detail_etag, post_state
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from .merge_feed import merged_follow_page
+from .models import Follow, Group, Post, TimelineEntry, User
+from .timeline import timeline_posts
 
 
-@cache_page(20, key_prefix='index_page')
+@read_only
+@condition(etag_func=feed_etag('index', 'meta'))
 def index(request):
-    posts_list = Post.objects.select_related('author', 'group')
-    page_obj = paginate_page(request=request, posts_list=posts_list)
-    context = {'page_obj': page_obj}
+    posts_list = (
+        Post.objects.select_related('author', 'group')
+        .prefetch_related('image_variants')
+    )
+    page_obj = paginate_page(
+        request=request,
+        posts_list=posts_list,
+        count_key=feed_count_key('index'),
+    )
+    context = {
+        'page_obj': page_obj,
+        **feed_cache_context(request, 'index', 'meta'),
+    }
     return render(request, 'posts/index.html', context)
 
 
+@read_only
+@condition(etag_func=feed_etag('group:{slug}', 'meta'))
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts_list = group.posts.select_related('author', 'group')
-    page_obj = paginate_page(request=request, posts_list=posts_list)
+    posts_list = (
+        group.posts.select_related('author', 'group')
+        .prefetch_related('image_variants')
+    )
+    page_obj = paginate_page(
+        request=request,
+        posts_list=posts_list,
+        count_key=feed_count_key('group', group.pk),
+    )
     context = {
         'group': group,
         'page_obj': page_obj,
+        **feed_cache_context(request, f'group:{slug}', 'meta'),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@read_only
+@condition(
+    etag_func=feed_etag('profile:{username}', 'followers:{username}', 'meta')
+)
 def profile(request, username):
     check_subscribes = None
-    author = get_object_or_404(User, username=username)
-    posts_list = author.posts.select_related('author', 'group')
-    page_obj = paginate_page(request=request, posts_list=posts_list)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    posts_list = (
+        author.posts.select_related('author', 'group')
+        .prefetch_related('image_variants')
+    )
+    page_obj = paginate_page(
+        request=request,
+        posts_list=posts_list,
+        count_key=feed_count_key('author', author.pk),
+    )
     if request.user.is_authenticated:
         check_subscribes = author.following.filter(user=request.user).exists()
     context = {
@@ -38,19 +82,29 @@ def profile(request, username):
         'page_obj': page_obj,
         'following': check_subscribes,
         'subscription_ban': author == request.user,
+        **feed_cache_context(request, f'profile:{username}', 'meta'),
     }
     return render(request, 'posts/profile.html', context)
 
 
+@read_only
+@condition(etag_func=post_detail_etag)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    comments = post.comments.select_related('author')
+    post = post_state(request, post_id)
+    if post is None:
+        raise Http404('Пост не найден')
+    comments = CursorPaginator(
+        post.comments.select_related('author'),
+        settings.LIMIT_COMMENTS,
+        field='created',
+    ).get_page(request.GET.get('cursor'))
     form = CommentForm(request.POST or None)
     context = {'post': post, 'comments': comments, 'form': form}
     return render(request, 'posts/post_detail.html', context)
 
 
 @login_required
+@disk_uploads
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     if not request.method == 'POST':
@@ -64,6 +118,7 @@ def post_create(request):
 
 
 @login_required
+@disk_uploads
 def post_edit(request, post_id):
     posts = get_object_or_404(Post, id=post_id)
     if request.user != posts.author:
@@ -91,11 +146,24 @@ def add_comment(request, post_id):
 
 
 @login_required
+@read_only
 def follow_index(request):
-    posts_list = Post.objects.filter(
-        author__following__user=request.user.id
-    ).select_related('author', 'group')
-    page_obj = paginate_page(request=request, posts_list=posts_list)
+    if settings.FOLLOW_FEED_ENGINE == 'merge':
+        page_obj = merged_follow_page(request)
+    else:
+        posts_list = (
+            timeline_posts(request.user)
+            .select_related('author', 'group')
+            .prefetch_related('image_variants')
+        )
+        page_obj = paginate_page(
+            request=request,
+            posts_list=posts_list,
+            count_key=feed_count_key('follow', request.user.pk),
+            count_list=TimelineEntry.objects.filter(user=request.user),
+            field='feed_date',
+            tiebreak='feed_post_id',
+        )
     context = {'page_obj': page_obj}
     return render(request, 'posts/follow.html', context)
 
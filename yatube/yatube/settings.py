@@ -52,12 +52,15 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ReadYourWritesMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
@@ -93,6 +96,47 @@ DATABASES = {
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
     }
 }
+# Реплики только для чтения: алиасы из DATABASES, с которых читают view,
+# помеченные core.routers.read_only. Для локальной проверки достаточно
+# второго файла SQLite:
+#     DATABASES['replica'] = {
+#         'ENGINE': 'django.db.backends.sqlite3',
+#         'NAME': os.path.join(BASE_DIR, 'replica.sqlite3'),
+#         'TEST': {'MIRROR': 'default'},
+#     }
+#     DATABASE_REPLICAS = ['replica']
+# и скопировать в него db.sqlite3 (или выполнить migrate --database replica).
+DATABASE_REPLICAS: list = []
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+# Бюджет SQL на один запрос (core.middleware.QueryBudgetMiddleware).
+# Замеряется доля запросов SAMPLE_RATE, превышения пишутся в лог
+# yatube.query_budget. MAX_REPEATS — сколько повторов одного шаблона SQL
+# считать N+1
+QUERY_BUDGET_SAMPLE_RATE: float = 1.0 if DEBUG else 0.05
+QUERY_BUDGET_MAX_QUERIES: int = 10
+QUERY_BUDGET_MAX_SQL_MS: float = 100
+QUERY_BUDGET_MAX_REPEATS: int = 5
+# Сколько секунд после своего изменяющего запроса клиент читает
+# с основной базы, пока реплики догоняют её
+READ_YOUR_WRITES_WINDOW: int = 10
+
+# Прагмы SQLite, выполняемые на каждом новом соединении (core.sqlite).
+# busy_timeout идёт первым, чтобы и смена режима журнала ждала блокировку.
+SQLITE_PRAGMAS = {
+    # Сколько миллисекунд ждать чужую блокировку до «database is locked»
+    'busy_timeout': 5000,
+    # WAL: читатели не блокируются записью, запись — чтением
+    'journal_mode': 'WAL',
+    # В режиме WAL fsync только на контрольной точке; данные не теряются
+    # при падении процесса, только при отказе питания
+    'synchronous': 'NORMAL',
+    # Отрицательное значение — размер кэша страниц в КиБ (64 МиБ)
+    'cache_size': -64000,
+    # Чтение файла базы через mmap (256 МиБ)
+    'mmap_size': 256 * 1024 * 1024,
+    # Временные таблицы и индексы сортировки держим в памяти
+    'temp_store': 'MEMORY',
+}
 
 
 # Password validation
@@ -143,6 +187,12 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 # Константа ограничивающая вывод постов на страницах в apps posts
 LIMIT_POSTS: int = 10
+# Число комментариев на странице поста; следующие подгружаются курсором
+# по (created, id), поэтому ответ не растёт вместе с обсуждением
+LIMIT_COMMENTS: int = 20
+# Режим пагинации лент: 'page' — номера страниц, 'cursor' — keyset-курсоры
+# по (pub_date, id). Курсорный режим включается и параметром ?cursor=
+PAGINATION_MODE: str = 'page'
 # Константа ограничивающая вывод текста поста при вызове models.__str__()
 LIMIT_TEXT: int = 15
 INTERNAL_IPS = [
@@ -151,8 +201,65 @@ INTERNAL_IPS = [
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Как core.media.serve отдаёт файлы: 'python' — сам (разработка),
+# 'x-accel-redirect' — через internal-location nginx с префиксом
+# MEDIA_ACCEL_PREFIX, 'x-sendfile' — через mod_xsendfile. Без DEBUG
+# по умолчанию ожидается nginx с локацией
+#     location /protected-media/ { internal; alias <MEDIA_ROOT>/; }
+# а для Apache режим нужно переключить на 'x-sendfile'.
+MEDIA_SERVE_MODE: str = 'python' if DEBUG else 'x-accel-redirect'
+MEDIA_ACCEL_PREFIX: str = '/protected-media/'
+# Время кэширования файлов с обычными именами; имена по содержимому
+# кэшируются на год с immutable
+MEDIA_MAX_AGE: int = 60 * 60
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.InstrumentedLocMemCache',
+        # Счётчики лент и списки последних постов авторов не должны
+        # вытеснять друг друга при стандартном лимите в 300 записей
+        'OPTIONS': {'MAX_ENTRIES': 10000},
     }
 }
+# Каталог, через который воркеры обмениваются метриками для /metrics.
+# None — метрики только текущего процесса (runserver, один воркер)
+METRICS_DIR = None
+# Как часто процесс сбрасывает свой снимок метрик в METRICS_DIR, секунд
+METRICS_FLUSH_INTERVAL: float = 1.0
+# /metrics открыт адресам из INTERNAL_IPS и запросам с заголовком
+# Authorization: Bearer <METRICS_TOKEN>; None — только INTERNAL_IPS
+METRICS_TOKEN = None
+# Бэкенд sorl-thumbnail с замером времени генерации миниатюр
+THUMBNAIL_BACKEND = 'core.thumbnails.TimedThumbnailBackend'
+# Процессы, в которых строятся миниатюры новых картинок постов;
+# 0 — строить сразу в процессе, сохранившем пост
+THUMBNAIL_WORKERS: int = 2
+# Ширины вариантов картинки поста в WebP и JPEG для srcset; браузер
+# выбирает из них ближайший к ширине экрана
+IMAGE_VARIANT_WIDTHS = (480, 960, 1440)
+# Ограничения загружаемых картинок постов. Формат и размеры читаются из
+# заголовка файла, поэтому «бомба» отклоняется до декодирования
+IMAGE_UPLOAD_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+IMAGE_UPLOAD_MAX_SIZE: int = 20 * 2 ** 20
+IMAGE_UPLOAD_MAX_PIXELS: int = 50_000_000
+# Более крупные оригиналы уменьшаются до этой длины большей стороны
+IMAGE_MAX_EDGE: int = 2560
+# Сколько секунд живёт счётчик записей ленты, посчитанный при холодном кэше
+FEED_COUNT_TIMEOUT: int = 60 * 10
+# Движок ленты подписок: 'timeline' — материализованная лента, которая
+# заполняется при публикации (fan-out on write), 'merge' — слияние
+# последних постов авторов при чтении (fan-out on read). При переходе
+# с 'merge' на 'timeline' ленту нужно заполнить заново
+FOLLOW_FEED_ENGINE: str = 'timeline'
+# Сколько последних постов автора держать в кэше для движка 'merge'
+FOLLOW_FEED_DEPTH: int = 100
+FOLLOW_FEED_TIMEOUT: int = 60 * 60
+# Время жизни кэша тела лент. Устаревшие копии отсекаются версиями
+# ключей, которые сигналы увеличивают при изменении данных. Версии лежат
+# в CACHES['default']: у LocMemCache он свой в каждом процессе, и новую
+# версию видит только воркер, обработавший запись. Поэтому с ним тела
+# лент и сами версии (а с ними и ETag) живут 20 секунд, как до версий.
+# Деплой с несколькими воркерами должен задать общий бэкенд (memcached,
+# redis): тогда версии бессрочны, а тела лент хранятся часами
+LOCAL_CACHE = 'LocMemCache' in CACHES['default']['BACKEND']
+PAGE_CACHE_TIMEOUT: int = 20 if LOCAL_CACHE else 60 * 60 * 4
+PAGE_VERSION_TIMEOUT = PAGE_CACHE_TIMEOUT if LOCAL_CACHE else None